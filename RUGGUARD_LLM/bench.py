@@ -0,0 +1,360 @@
+# bench.py - Project RUGGUARD // OFFLINE REPLAY BENCHMARK
+#
+# Replays a recorded trigger file through the real pipeline in main.py, with the X and
+# Gemini clients swapped for local stand-ins that simulate latency, rate limits and errors.
+#
+#   python bench.py --triggers bench_triggers.jsonl --speed 10 --x-latency-ms 120
+
+import os
+import io
+import sys
+import re
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+# --- main.py refuses to start without keys; the stand-ins never use them. ---
+for key in ["X_BEARER_TOKEN", "X_API_KEY", "X_API_KEY_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET", "GOOGLE_API_KEY"]:
+    os.environ.setdefault(key, "benchmark")
+# --- Every run starts cold, with its own throwaway database. ---
+BENCH_DIR = tempfile.mkdtemp(prefix="rugguard-bench-")
+os.environ["RUGGUARD_DB_PATH"] = os.path.join(BENCH_DIR, "bench.db")
+os.environ["RUGGUARD_LLM_CACHE_PATH"] = os.path.join(BENCH_DIR, "llm-cache.db")
+
+import tweepy
+import main
+
+
+# ==============================================================================
+# 1. LOCAL STAND-INS FOR THE X AND GEMINI CLIENTS
+# ==============================================================================
+class UpstreamSimulator:
+    """Shared latency, error-rate and rate-limit simulation plus per-endpoint call counters."""
+    def __init__(self, latency_ms: float, error_rate: float, limit_per_window: int, window_seconds: float, seed: int,
+                 acquire_locally: bool = False):
+        self.acquire_locally = acquire_locally
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.limit_per_window = limit_per_window
+        self.window_seconds = window_seconds
+        self.calls = Counter()
+        self.errors = Counter()
+        self.rate_limited = Counter()
+        self._windows = defaultdict(lambda: [0.0, 0])
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint: str, sleep: bool = True) -> float:
+        """
+        Simulates one upstream request: quota check, latency, then a possible injected error.
+        Returns the drawn latency; with sleep=False the caller is responsible for spending it.
+        """
+        # --- Mirrors RateLimitedClient.request(), which the stand-in client bypasses ---
+        if self.acquire_locally:
+            main.rate_limiter.acquire(endpoint)
+        with self._lock:
+            self.calls[endpoint] += 1
+            now = time.time()
+            window = self._windows[endpoint]
+            if now - window[0] >= self.window_seconds:
+                window[0], window[1] = now, 0
+            window[1] += 1
+            remaining = self.limit_per_window - window[1]
+            reset_at = window[0] + self.window_seconds
+            latency = self._random.expovariate(1000 / self.latency_ms) if self.latency_ms else 0
+            fails = self._random.random() < self.error_rate
+
+        headers = {
+            "x-rate-limit-limit": str(self.limit_per_window),
+            "x-rate-limit-remaining": str(max(remaining, 0)),
+            "x-rate-limit-reset": str(reset_at),
+        }
+        if remaining < 0:
+            with self._lock:
+                self.rate_limited[endpoint] += 1
+            main.rate_limiter.update_from_headers(endpoint, headers)
+            raise main.RateLimited(endpoint, max(reset_at - time.time(), 0.01))
+
+        if sleep:
+            time.sleep(latency)
+        if fails:
+            with self._lock:
+                self.errors[endpoint] += 1
+            raise tweepy.TweepyException(f"simulated {endpoint} failure")
+        main.rate_limiter.update_from_headers(endpoint, headers)
+        return latency
+
+def fake_user(user_id) -> tweepy.User:
+    """Builds a deterministic synthetic profile for a user ID."""
+    rng = random.Random(int(user_id))
+    created_at = datetime.now(timezone.utc) - timedelta(days=rng.choice([2, 40, 400, 1500, 4000]))
+    return tweepy.User({
+        "id": str(user_id),
+        "name": f"Bench User {user_id}",
+        "username": f"bench_{user_id}",
+        "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "description": rng.choice(["Building on-chain.", "", "100x gem hunter 🚀 DM for promo", "Core dev."]),
+        "public_metrics": {
+            "followers_count": rng.choice([0, 120, 4000, 250000]),
+            "following_count": rng.choice([0, 80, 900, 5000]),
+            "tweet_count": rng.randint(0, 20000),
+            "listed_count": rng.randint(0, 500),
+        },
+        "verified": rng.random() < 0.2,
+    })
+
+def fake_tweet(tweet_id, author_id, text: str) -> tweepy.Tweet:
+    return tweepy.Tweet({
+        "id": str(tweet_id),
+        "text": text,
+        "author_id": str(author_id),
+        "edit_history_tweet_ids": [str(tweet_id)],
+    })
+
+class FakeClient:
+    """Stand-in for tweepy.Client covering the endpoints main.py calls."""
+    def __init__(self, simulator: UpstreamSimulator, authors: dict):
+        self.simulator = simulator
+        self.authors = authors
+        self.replies = {}
+
+    def get_user(self, id, **kwargs):
+        self.simulator.call("get_user")
+        return tweepy.Response(fake_user(id), {}, [], {})
+
+    def get_users(self, ids, **kwargs):
+        self.simulator.call("get_users")
+        return tweepy.Response([fake_user(user_id) for user_id in ids], {}, [], {})
+
+    def get_users_tweets(self, id, max_results=5, **kwargs):
+        self.simulator.call("get_users_tweets")
+        tweets = [fake_tweet(int(id) * 100 + n, id, f"Update #{n} from bench_{id} https://t.co/x{n}") for n in range(max_results)]
+        return tweepy.Response(tweets, {}, [], {"result_count": len(tweets)})
+
+    def get_tweet(self, id, **kwargs):
+        self.simulator.call("get_tweet")
+        return tweepy.Response(fake_tweet(id, self.authors[int(id)], "original"), {}, [], {})
+
+    def get_tweets(self, ids, **kwargs):
+        self.simulator.call("get_tweets")
+        return tweepy.Response([fake_tweet(tweet_id, self.authors[int(tweet_id)], "original") for tweet_id in ids], {}, [], {})
+
+    def create_tweet(self, text, in_reply_to_tweet_id=None, **kwargs):
+        self.simulator.call("create_tweet")
+        self.replies[int(in_reply_to_tweet_id)] = time.monotonic()
+        return tweepy.Response({"id": str(in_reply_to_tweet_id + 1), "text": text}, {}, [], {})
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+# --- The trailing chatter after the Trust Signal is what early stopping should never wait for ---
+FAKE_GEMINI_CHUNKS = [
+    "The account shows a mix of project updates ",
+    "and promotional links with modest engagement.\n",
+    "Trust Signal: Neu",
+    "tral",
+    "\n\nLet me know if you would like a deeper breakdown of individual tweets.",
+]
+FAKE_GEMINI_VERDICT = {
+    "summary": "The account shows a mix of project updates and promotional links with modest engagement.",
+    "trust_signal": "Neutral",
+    "red_flags": ["frequent promotional links"],
+}
+
+class FakeGenerativeModel:
+    """
+    Stand-in for genai.GenerativeModel that returns a canned summary after simulated latency.
+    Streamed responses spread the latency across the chunks; JSON requests get a verdict object,
+    or one per "[id: ...]" section of a batched prompt.
+    """
+    model_name = "models/bench-fake"
+
+    def __init__(self, simulator: UpstreamSimulator):
+        self.simulator = simulator
+        self.chunks_served = 0
+
+    def count_tokens(self, prompt):
+        self.simulator.call("count_tokens")
+        return FakeTokenCount(len(prompt) // 4)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        latency = self.simulator.call("generate_content", sleep=not stream)
+        if stream:
+            return self._stream(latency)
+        if (kwargs.get("generation_config") or {}).get("response_mime_type") == "application/json":
+            ids = re.findall(r"^\[id: ([^\]]+)\]$", prompt, re.MULTILINE)
+            if not ids:
+                return FakeGeminiResponse(json.dumps(FAKE_GEMINI_VERDICT))
+            return FakeGeminiResponse(json.dumps([{"id": key, **FAKE_GEMINI_VERDICT} for key in ids]))
+        return FakeGeminiResponse("".join(FAKE_GEMINI_CHUNKS))
+
+    def _stream(self, latency: float):
+        per_chunk = latency / len(FAKE_GEMINI_CHUNKS)
+        for text in FAKE_GEMINI_CHUNKS:
+            time.sleep(per_chunk)
+            self.chunks_served += 1
+            yield FakeGeminiResponse(text)
+
+def stream_payload(trigger: dict) -> str:
+    """Serializes a trigger the way the filtered stream sends it, so tweepy's own on_data dispatch runs."""
+    payload = {
+        "data": {
+            "id": str(trigger["id"]),
+            "text": trigger["text"],
+            "edit_history_tweet_ids": [str(trigger["id"])],
+            "referenced_tweets": [{"type": "replied_to", "id": str(trigger["in_reply_to_tweet_id"])}],
+        },
+        "matching_rules": [{"id": "1", "tag": None}],
+    }
+    if trigger.get("expanded_author", True):
+        original_id = str(trigger["in_reply_to_tweet_id"])
+        payload["includes"] = {"tweets": [{
+            "id": original_id,
+            "text": "original",
+            "author_id": str(trigger["original_author_id"]),
+            "edit_history_tweet_ids": [original_id],
+        }]}
+    return json.dumps(payload)
+
+class FakeStreamingClient:
+    """
+    Replays recorded triggers into a real BotStreamListener, the way tweepy's StreamingClient
+    would deliver them, honoring the recorded offsets divided by `speed` (0 = no pauses).
+    """
+    def __init__(self, triggers: list, speed: float):
+        self.triggers = triggers
+        self.speed = speed
+        self.delivered = {}
+
+    def replay(self, listener):
+        started = time.monotonic()
+        for trigger in self.triggers:
+            if self.speed:
+                delay = trigger["offset_ms"] / 1000 / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            self.delivered[trigger["id"]] = time.monotonic()
+            listener.on_data(stream_payload(trigger))
+
+
+# ==============================================================================
+# 2. REPLAY & REPORTING
+# ==============================================================================
+def failed_triggers() -> int:
+    """
+    Triggers the bot gave up on, read from the trigger table: analysis errors marked by the workers
+    and replies the outbox could not post. A trigger is done once it failed or its reply was posted.
+    """
+    return main.get_analysis_store().count_triggers().get("failed", 0)
+
+def load_triggers(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile; 0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def run_benchmark(args) -> dict:
+    """Runs one replay and returns the measured throughput, latencies and upstream call counts."""
+    triggers = load_triggers(args.triggers)
+    x_simulator = UpstreamSimulator(args.x_latency_ms, args.x_error_rate, args.x_rate_limit, args.x_rate_window, args.seed,
+                                    acquire_locally=True)
+    gemini_simulator = UpstreamSimulator(args.gemini_latency_ms, args.gemini_error_rate, args.gemini_rpm, 60, args.seed + 1)
+
+    # --- The local token buckets are configured with the same limits the stand-ins enforce ---
+    limits = dict(main.RATE_LIMITS)
+    for endpoint in ["get_user", "get_users", "get_users_tweets", "get_tweet", "get_tweets", "create_tweet"]:
+        limits[endpoint] = (args.x_rate_limit, args.x_rate_window)
+    limits["gemini_requests"] = (args.gemini_rpm, 60)
+    main.rate_limiter = main.RateLimiter(limits, main.RATE_LIMIT_MAX_INLINE_WAIT_SECONDS)
+
+    x_client = FakeClient(x_simulator, {t["in_reply_to_tweet_id"]: t["original_author_id"] for t in triggers})
+    main.x_client = x_client
+    main.gemini_model = FakeGenerativeModel(gemini_simulator)
+    stream = FakeStreamingClient(triggers, args.speed)
+
+    log = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(log):
+        main.start_workers(args.workers)
+        listener = main.build_listener_class()(bearer_token=main.X_BEARER_TOKEN)
+        started = time.monotonic()
+        stream.replay(listener)
+        deadline = time.monotonic() + args.timeout
+        while len(x_client.replies) + failed_triggers() < len(triggers) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        elapsed = time.monotonic() - started
+
+    latencies = [(x_client.replies[tweet_id] - delivered) * 1000
+                 for tweet_id, delivered in stream.delivered.items() if tweet_id in x_client.replies]
+    return {
+        "triggers": len(triggers),
+        "replied": len(latencies),
+        "failed": failed_triggers(),
+        "elapsed_s": round(elapsed, 3),
+        "triggers_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+        },
+        "upstream_calls": dict(x_simulator.calls + gemini_simulator.calls),
+        "upstream_errors": dict(x_simulator.errors + gemini_simulator.errors),
+        "upstream_rate_limited": dict(x_simulator.rate_limited + gemini_simulator.rate_limited),
+        "cache": main.analysis_cache.stats(),
+        "stages": main.stage_metrics.summary_line(),
+    }
+
+def format_summary(result: dict) -> str:
+    lines = [
+        f"triggers: {result['replied']}/{result['triggers']} replied in {result['elapsed_s']}s "
+        f"({result['triggers_per_s']} triggers/sec, {result['failed']} failed)",
+        f"end-to-end latency: p50 {result['latency_ms']['p50']} ms, p95 {result['latency_ms']['p95']} ms, "
+        f"p99 {result['latency_ms']['p99']} ms",
+        "upstream calls: " + ", ".join(f"{name}={count}" for name, count in sorted(result["upstream_calls"].items())),
+    ]
+    if result["upstream_errors"]:
+        lines.append("upstream errors: " + ", ".join(f"{k}={v}" for k, v in sorted(result["upstream_errors"].items())))
+    if result["upstream_rate_limited"]:
+        lines.append("rate limited: " + ", ".join(f"{k}={v}" for k, v in sorted(result["upstream_rate_limited"].items())))
+    lines.append(f"result cache: {result['cache']}")
+    lines.append(f"stages: {result['stages']}")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the RUGGUARD pipeline.")
+    parser.add_argument("--triggers", default=os.path.join(os.path.dirname(__file__), "bench_triggers.jsonl"),
+                        help="Recorded trigger file (JSONL).")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed multiplier; 0 replays without pauses.")
+    parser.add_argument("--workers", type=int, default=main.WORKER_COUNT, help="Analysis worker threads.")
+    parser.add_argument("--x-latency-ms", type=float, default=80, help="Mean simulated X API latency.")
+    parser.add_argument("--x-error-rate", type=float, default=0.0, help="Fraction of X calls that fail.")
+    parser.add_argument("--x-rate-limit", type=int, default=900, help="Simulated X requests per endpoint per window.")
+    parser.add_argument("--x-rate-window", type=float, default=900, help="Simulated X rate-limit window in seconds.")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800, help="Mean simulated Gemini latency.")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="Fraction of Gemini calls that fail.")
+    parser.add_argument("--gemini-rpm", type=int, default=1000, help="Simulated Gemini requests per minute.")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for outstanding replies.")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for simulated latencies and errors.")
+    parser.add_argument("--json", action="store_true", help="Print the raw result as JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's own log output.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run_benchmark(args)
+    print(json.dumps(result, indent=2) if args.json else format_summary(result))
@@ -1,13 +1,35 @@
 # main.py - Project RUGGUARD // LLM-POWERED ANALYSIS BOT
+from __future__ import annotations
+
+import time
+IMPORT_STARTED = time.perf_counter()
 
 import os
-import tweepy
-import google.generativeai as genai
+import re
+import json
+import queue
+import atexit
+import sqlite3
+import argparse
+import asyncio
+import sys
+import threading
+import heapq
+import bisect
+import itertools
+import random
+import hashlib
+import functools
+import importlib
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # ==============================================================================
-# 1. CONFIGURATION & CLIENT INITIALIZATION
+# 1. CONFIGURATION
 # ==============================================================================
 load_dotenv()
 
@@ -23,156 +45,2851 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not all([X_BEARER_TOKEN, X_API_KEY, X_API_KEY_SECRET, X_ACCESS_TOKEN, X_ACCESS_TOKEN_SECRET, GOOGLE_API_KEY]):
     raise ValueError("FATAL ERROR: All 6 API keys (5 for X, 1 for Google) must be set in Replit Secrets or .env file.")
 
-# --- Configure clients ---
-try:
-    x_client = tweepy.Client(
-        bearer_token=X_BEARER_TOKEN, consumer_key=X_API_KEY,
-        consumer_secret=X_API_KEY_SECRET, access_token=X_ACCESS_TOKEN,
-        access_token_secret=X_ACCESS_TOKEN_SECRET, wait_on_rate_limit=True
-    )
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
-    print("INFO: X and Google AI clients configured successfully.")
-except Exception as e:
-    raise ConnectionError(f"Failed to initialize API clients: {e}")
-
 # --- Bot Settings ---
 BOT_USERNAME = "projectruggaurd"
 TRIGGER_PHRASE = "riddle me this"
 
+# --- Pipeline Settings ---
+WORKER_COUNT = int(os.getenv("RUGGUARD_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("RUGGUARD_QUEUE_SIZE", "500"))
+USER_BATCH_MAX_SIZE = int(os.getenv("RUGGUARD_USER_BATCH_MAX_SIZE", "100"))
+USER_BATCH_WINDOW_SECONDS = float(os.getenv("RUGGUARD_USER_BATCH_WINDOW_MS", "200")) / 1000
+TWEET_BATCH_MAX_SIZE = int(os.getenv("RUGGUARD_TWEET_BATCH_MAX_SIZE", "100"))
+TWEET_BATCH_WINDOW_SECONDS = float(os.getenv("RUGGUARD_TWEET_BATCH_WINDOW_MS", "200")) / 1000
+ASYNC_X_CONCURRENCY = int(os.getenv("RUGGUARD_ASYNC_X_CONCURRENCY", "50"))
+ASYNC_GEMINI_CONCURRENCY = int(os.getenv("RUGGUARD_ASYNC_GEMINI_CONCURRENCY", "20"))
+CACHE_TTL_SECONDS = int(os.getenv("RUGGUARD_CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("RUGGUARD_CACHE_MAX_ENTRIES", "1000"))
+
+# --- Persistence Settings ---
+DB_PATH = os.getenv("RUGGUARD_DB_PATH", "rugguard.db")
+DB_COMMIT_BATCH = int(os.getenv("RUGGUARD_DB_COMMIT_BATCH", "20"))
+DB_COMMIT_INTERVAL_SECONDS = float(os.getenv("RUGGUARD_DB_COMMIT_INTERVAL_SECONDS", "5"))
+DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("RUGGUARD_DB_BUSY_TIMEOUT_SECONDS", "30"))
+VERDICT_MAX_AGE_SECONDS = int(os.getenv("RUGGUARD_VERDICT_MAX_AGE_SECONDS", str(CACHE_TTL_SECONDS)))
+LLM_CACHE_PATH = os.getenv("RUGGUARD_LLM_CACHE_PATH", "rugguard-llm-cache.db")
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("RUGGUARD_LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+INCREMENTAL_ENABLED = os.getenv("RUGGUARD_INCREMENTAL", "1") == "1"
+INCREMENTAL_MAX_AGE_SECONDS = int(os.getenv("RUGGUARD_INCREMENTAL_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+INCREMENTAL_METRIC_CHANGE_RATIO = float(os.getenv("RUGGUARD_INCREMENTAL_METRIC_CHANGE_PCT", "10")) / 100
+TRIGGER_RETENTION_SECONDS = int(os.getenv("RUGGUARD_TRIGGER_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# --- Fast-Path Heuristics: clear-cut accounts are scored locally without calling Gemini ---
+HEURISTICS_ENABLED = os.getenv("RUGGUARD_HEURISTICS", "1") == "1"
+HEURISTIC_NEW_ACCOUNT_MAX_DAYS = 7
+HEURISTIC_NEW_ACCOUNT_MAX_FOLLOWERS = 5
+HEURISTIC_ESTABLISHED_MIN_DAYS = 2 * 365
+HEURISTIC_ESTABLISHED_MIN_FOLLOWERS = 10000
+HEURISTIC_ESTABLISHED_MIN_RATIO = 10
+
+# --- Rate Limit Settings: (requests, window seconds) per endpoint ---
+X_RATE_LIMIT_WINDOW_SECONDS = 15 * 60
+RATE_LIMITS = {
+    "get_user": (int(os.getenv("RUGGUARD_LIMIT_GET_USER", "900")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "get_users": (int(os.getenv("RUGGUARD_LIMIT_GET_USERS", "900")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "get_users_tweets": (int(os.getenv("RUGGUARD_LIMIT_GET_USERS_TWEETS", "900")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "get_tweet": (int(os.getenv("RUGGUARD_LIMIT_GET_TWEET", "900")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "get_tweets": (int(os.getenv("RUGGUARD_LIMIT_GET_TWEETS", "900")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "create_tweet": (int(os.getenv("RUGGUARD_LIMIT_CREATE_TWEET", "200")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "get_users_mentions": (int(os.getenv("RUGGUARD_LIMIT_GET_USERS_MENTIONS", "180")), X_RATE_LIMIT_WINDOW_SECONDS),
+    "gemini_requests": (int(os.getenv("RUGGUARD_GEMINI_RPM", "15")), 60),
+    "gemini_tokens": (int(os.getenv("RUGGUARD_GEMINI_TPM", "1000000")), 60),
+    "gemini_count_tokens": (int(os.getenv("RUGGUARD_GEMINI_COUNT_TOKENS_RPM", "3000")), 60),
+}
+RATE_LIMIT_MAX_INLINE_WAIT_SECONDS = float(os.getenv("RUGGUARD_RATE_LIMIT_MAX_INLINE_WAIT", "2"))
+GEMINI_OUTPUT_TOKEN_ESTIMATE = 256
+GEMINI_QUOTA_RETRY_SECONDS = 60.0
+X_LOOKUP_RETRY_SECONDS = float(os.getenv("RUGGUARD_X_LOOKUP_RETRY_SECONDS", "30"))
+
+# --- Gemini Generation Settings ---
+GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
+GEMINI_STREAMING = os.getenv("RUGGUARD_GEMINI_STREAM", "1") == "1"
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("RUGGUARD_LLM_MAX_OUTPUT_TOKENS", "256"))
+LLM_GENERATION_CONFIG = {"max_output_tokens": LLM_MAX_OUTPUT_TOKENS}
+GEMINI_JSON_OUTPUT = os.getenv("RUGGUARD_GEMINI_JSON", "0") == "1"
+# --- JSON mode constrains decoding to this schema; LLMVerdict.from_dict still validates every answer ---
+LLM_VERDICT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "trust_signal": {"type": "STRING", "format": "enum", "enum": ["Positive", "Neutral", "Caution", "Red Flag"]},
+        "red_flags": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["summary", "trust_signal", "red_flags"],
+}
+LLM_JSON_GENERATION_CONFIG = {
+    **LLM_GENERATION_CONFIG, "response_mime_type": "application/json", "response_schema": LLM_VERDICT_SCHEMA,
+}
+LLM_BATCH_GENERATION_CONFIG = {
+    **LLM_JSON_GENERATION_CONFIG,
+    "response_schema": {
+        "type": "ARRAY",
+        "items": {
+            **LLM_VERDICT_SCHEMA,
+            "properties": {"id": {"type": "STRING"}, **LLM_VERDICT_SCHEMA["properties"]},
+            "required": ["id", *LLM_VERDICT_SCHEMA["required"]],
+        },
+    },
+}
+PROMPT_TOKEN_BUDGET = int(os.getenv("RUGGUARD_PROMPT_TOKEN_BUDGET", "1024"))
+PROMPT_MAX_TWEET_CHARS = 280
+LLM_BATCH_SIZE = int(os.getenv("RUGGUARD_LLM_BATCH_SIZE", "1"))
+LLM_BATCH_WINDOW_SECONDS = float(os.getenv("RUGGUARD_LLM_BATCH_WINDOW_MS", "500")) / 1000
+LLM_BATCH_CONCURRENCY = int(os.getenv("RUGGUARD_LLM_BATCH_CONCURRENCY", "4"))
+
+# --- Observability Settings ---
+METRICS_SUMMARY_INTERVAL_SECONDS = float(os.getenv("RUGGUARD_METRICS_SUMMARY_SECONDS", "60"))
+METRICS_PORT = int(os.getenv("RUGGUARD_METRICS_PORT", "0"))
+IMPORT_TIME_BUDGET_MS = float(os.getenv("RUGGUARD_IMPORT_BUDGET_MS", "250"))
+
+# --- Stream Settings ---
+STREAM_RULE = f"@{BOT_USERNAME} {TRIGGER_PHRASE}"
+# --- referenced_tweets.id puts the replied-to tweet (with its author_id) in the stream's includes ---
+STREAM_EXPANSIONS = ["author_id", "referenced_tweets.id"]
+STREAM_TWEET_FIELDS = ["referenced_tweets", "author_id"]
+
+# --- Reply Outbox: finished reports are posted from the trigger table by one paced poster thread ---
+REPLY_MIN_INTERVAL_SECONDS = float(os.getenv("RUGGUARD_REPLY_MIN_INTERVAL_MS", "0")) / 1000
+REPLY_MAX_ATTEMPTS = int(os.getenv("RUGGUARD_REPLY_MAX_ATTEMPTS", "6"))
+REPLY_RETRY_BASE_SECONDS = 2.0
+REPLY_RETRY_MAX_SECONDS = 300.0
+
+# --- Multi-Process Mode: roles share the SQLite trigger table as their job broker ---
+BROKER_POLL_SECONDS = float(os.getenv("RUGGUARD_BROKER_POLL_MS", "250")) / 1000
+BROKER_LEASE_SECONDS = float(os.getenv("RUGGUARD_BROKER_LEASE_SECONDS", "300"))
+BROKER_ERROR_MAX_BACKOFF_SECONDS = 30.0
+PROCESS_RESTART_DELAY_SECONDS = 5.0
+
+# --- Mentions Backfill: catches triggers posted while the stream was down ---
+BACKFILL_ENABLED = os.getenv("RUGGUARD_BACKFILL", "1") == "1"
+BACKFILL_INTERVAL_SECONDS = float(os.getenv("RUGGUARD_BACKFILL_INTERVAL_SECONDS", "0"))
+BACKFILL_FIRST_RUN_LOOKBACK_SECONDS = int(os.getenv("RUGGUARD_BACKFILL_LOOKBACK_SECONDS", "3600"))
+BACKFILL_PAGE_SIZE = 100
+BATCH_CONCURRENCY = int(os.getenv("RUGGUARD_BATCH_CONCURRENCY", str(WORKER_COUNT)))
+BACKFILL_MAX_PAGES = int(os.getenv("RUGGUARD_BACKFILL_MAX_PAGES", "8"))
+
+
+# ==============================================================================
+# 2. RATE LIMITING: PER-ENDPOINT TOKEN BUCKETS
+# ==============================================================================
+class RateLimited(Exception):
+    """Raised instead of sleeping when an endpoint's bucket will not refill soon enough."""
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"{endpoint} rate limited, retry in {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """A bucket of `capacity` tokens refilled evenly over `window_seconds`."""
+    def __init__(self, capacity: float, window_seconds: float):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        rate = self.capacity / self.window_seconds
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    def try_consume(self, cost: float = 1) -> float:
+        """Consumes `cost` tokens and returns 0, or returns the seconds until they will be available."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) * self.window_seconds / self.capacity
+
+    def sync(self, limit: int, remaining: int, reset_at: float):
+        """Aligns the bucket with the server's view of the window (x-rate-limit-* headers)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.capacity = max(limit, 1)
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            self.blocked_until = now + max(reset_at - time.time(), 0)
+
+class RateLimiter:
+    """
+    Schedules upstream calls against per-endpoint token buckets.
+    Short waits are slept inline; longer ones raise RateLimited so the caller can
+    defer the job and work on something else instead of freezing a thread.
+    """
+    def __init__(self, limits: dict, max_inline_wait: float):
+        self.max_inline_wait = max_inline_wait
+        self._buckets = {name: TokenBucket(capacity, window) for name, (capacity, window) in limits.items()}
+        self._lock = threading.Lock()
+
+    def wait_time(self, endpoint: str, cost: float = 1) -> float:
+        """Tries to take `cost` tokens; returns 0 on success or the seconds to wait otherwise."""
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            return bucket.try_consume(cost) if bucket else 0.0
+
+    def acquire(self, endpoint: str, cost: float = 1):
+        """Blocks for at most max_inline_wait seconds, otherwise raises RateLimited."""
+        while wait := self.wait_time(endpoint, cost):
+            if wait > self.max_inline_wait:
+                raise RateLimited(endpoint, wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, endpoint: str, cost: float = 1):
+        """Event-loop variant of acquire(): waits without blocking other tasks."""
+        while wait := self.wait_time(endpoint, cost):
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, endpoint: str, headers):
+        """Feeds x-rate-limit-limit/remaining/reset response headers back into the endpoint's bucket."""
+        try:
+            limit = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_at = float(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            bucket = self._buckets.setdefault(endpoint, TokenBucket(limit, X_RATE_LIMIT_WINDOW_SECONDS))
+            bucket.sync(limit, remaining, reset_at)
+
+    def remaining(self) -> dict:
+        """Returns the (approximate) tokens left per endpoint."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self._buckets.values():
+                bucket._refill(now)
+            return {name: int(bucket.tokens) for name, bucket in self._buckets.items()}
+
+# --- Maps tweepy request routes to the endpoint names the buckets are keyed by ---
+X_ENDPOINT_ROUTES = [
+    ("POST", re.compile(r"^/2/tweets$"), "create_tweet"),
+    ("GET", re.compile(r"^/2/tweets$"), "get_tweets"),
+    ("GET", re.compile(r"^/2/tweets/\d+$"), "get_tweet"),
+    ("GET", re.compile(r"^/2/users$"), "get_users"),
+    ("GET", re.compile(r"^/2/users/by$"), "get_users"),
+    ("GET", re.compile(r"^/2/users/\d+/tweets$"), "get_users_tweets"),
+    ("GET", re.compile(r"^/2/users/\d+/mentions$"), "get_users_mentions"),
+    ("GET", re.compile(r"^/2/users/\d+$"), "get_user"),
+    ("GET", re.compile(r"^/2/users/by/username/[^/]+$"), "get_user"),
+]
+
+def endpoint_for_route(method: str, route: str) -> str:
+    for route_method, pattern, endpoint in X_ENDPOINT_ROUTES:
+        if method == route_method and pattern.match(route):
+            return endpoint
+    return f"{method} {route}"
+
+@functools.lru_cache(maxsize=None)
+def build_rate_limited_client_class():
+    """
+    Builds the tweepy.Client subclass on first use, so importing this module does not import tweepy.
+    """
+    class RateLimitedClient(tweepy.Client):
+        """
+        tweepy.Client that takes a token before every request and keeps the buckets in
+        sync with the x-rate-limit-* headers, instead of relying on wait_on_rate_limit.
+        """
+        def request(self, method, route, params=None, json=None, user_auth=False):
+            endpoint = endpoint_for_route(method, route)
+            rate_limiter.acquire(endpoint)
+            try:
+                response = super().request(method, route, params=params, json=json, user_auth=user_auth)
+            except tweepy.TooManyRequests as e:
+                rate_limiter.update_from_headers(endpoint, e.response.headers)
+                raise RateLimited(endpoint, retry_after_429(e.response.headers)) from e
+            rate_limiter.update_from_headers(endpoint, response.headers)
+            return response
+
+    return RateLimitedClient
+
+def retry_after_429(headers) -> float:
+    """Seconds until x-rate-limit-reset (60 when the header is missing), never less than 1."""
+    reset = (headers or {}).get("x-rate-limit-reset")
+    return max(float(reset) - time.time() if reset else 60.0, 1.0)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token) used for TPM budgeting."""
+    return len(text) // 4 + 1
+
+def acquire_gemini_quota(prompt: str):
+    """Takes one request and the prompt's estimated tokens from the Gemini RPM/TPM buckets."""
+    rate_limiter.acquire("gemini_requests")
+    rate_limiter.acquire("gemini_tokens", estimate_tokens(prompt) + GEMINI_OUTPUT_TOKEN_ESTIMATE)
+
+async def acquire_gemini_quota_async(prompt: str):
+    await rate_limiter.acquire_async("gemini_requests")
+    await rate_limiter.acquire_async("gemini_tokens", estimate_tokens(prompt) + GEMINI_OUTPUT_TOKEN_ESTIMATE)
+
+rate_limiter = RateLimiter(RATE_LIMITS, RATE_LIMIT_MAX_INLINE_WAIT_SECONDS)
+
+
+# ==============================================================================
+# 3. METRICS: PER-STAGE LATENCY & OUTCOMES
+# ==============================================================================
+class Histogram:
+    """Fixed-bucket latency histogram (seconds), cheap enough to update on every call."""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(self.BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the last finite bound for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.BUCKETS, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else self.BUCKETS[-2]
+        return self.BUCKETS[-2]
+
+class StageMetrics:
+    """Latency histograms and success/error/rate_limited counters for each pipeline stage."""
+    def __init__(self):
+        self._histograms = defaultdict(Histogram)
+        self._outcomes = defaultdict(Counter)
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, outcome: str = "success"):
+        with self._lock:
+            self._histograms[stage].observe(seconds)
+            self._outcomes[stage][outcome] += 1
+
+    def increment(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def counters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    @contextmanager
+    def time(self, stage: str):
+        """Times the enclosed block; the outcome is derived from the exception (if any) it raises."""
+        started = time.perf_counter()
+        outcome = "success"
+        try:
+            yield
+        except (RateLimited, tweepy.TooManyRequests, google_exceptions.ResourceExhausted):
+            outcome = "rate_limited"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, outcome)
+
+    def snapshot(self) -> dict:
+        """Returns a point-in-time copy of every stage's buckets, totals, quantiles and outcome counts."""
+        with self._lock:
+            return {
+                stage: {
+                    "buckets": list(zip(Histogram.BUCKETS, histogram.bucket_counts)),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "outcomes": dict(self._outcomes[stage]),
+                }
+                for stage, histogram in self._histograms.items()
+            }
+
+    def summary_line(self) -> str:
+        parts = []
+        for stage, data in sorted(self.snapshot().items()):
+            outcomes = data["outcomes"]
+            parts.append(
+                f"{stage} n={data['count']} p50<={data['p50']}s p95<={data['p95']}s "
+                f"err={outcomes.get('error', 0)} rl={outcomes.get('rate_limited', 0)}"
+            )
+        return " | ".join(parts) or "no activity yet"
+
+def start_metrics_reporter(interval: float = METRICS_SUMMARY_INTERVAL_SECONDS):
+    """Prints one stage summary line every `interval` seconds from a daemon thread (0 disables it)."""
+    if interval <= 0:
+        return None
+
+    def report_forever():
+        while True:
+            time.sleep(interval)
+            print(f"INFO: Stage summary: {stage_metrics.summary_line()}")
+
+    reporter = threading.Thread(target=report_forever, name="rugguard-metrics", daemon=True)
+    reporter.start()
+    return reporter
+
+stage_metrics = StageMetrics()
+
+# --- Prometheus text exposition, served by the optional built-in metrics endpoint ---
+def format_labels(**labels) -> str:
+    if not labels:
+        return ""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+def render_prometheus_metrics() -> str:
+    """Renders queue, cache, quota, token and stage metrics in the Prometheus text format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples: list):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{format_labels(**labels)} {value}")
+
+    metric("rugguard_queue_depth", "gauge", "Trigger jobs waiting in the worker queue.",
+           [("", {}, job_queue.qsize())])
+    metric("rugguard_inflight_analyses", "gauge", "Distinct target analyses currently running.",
+           [("", {}, analysis_flights.in_flight() + async_analysis_flights.in_flight())])
+    triggers = get_analysis_store().count_triggers()
+    metric("rugguard_broker_backlog", "gauge",
+           "Journaled triggers waiting for analysis (pending) or for their reply (analyzed); shared by all processes.",
+           [("", {"status": status}, triggers.get(status, 0)) for status in ("pending", "analyzed")])
+
+    cache = analysis_cache.stats()
+    metric("rugguard_cache_hits_total", "counter", "Result cache hits.", [("", {}, cache["hits"])])
+    metric("rugguard_cache_misses_total", "counter", "Result cache misses.", [("", {}, cache["misses"])])
+    metric("rugguard_cache_hit_ratio", "gauge", "Result cache hit ratio since start.", [("", {}, cache["hit_ratio"])])
+    if llm_response_cache:
+        llm_cache = llm_response_cache.stats()
+        metric("rugguard_llm_cache_hits_total", "counter", "Gemini response cache hits.", [("", {}, llm_cache["hits"])])
+        metric("rugguard_llm_cache_misses_total", "counter", "Gemini response cache misses.", [("", {}, llm_cache["misses"])])
+        metric("rugguard_llm_cache_evictions_total", "counter", "Gemini responses evicted to stay under the size cap.",
+               [("", {}, llm_cache["evictions"])])
+
+    metric("rugguard_rate_limit_remaining", "gauge", "Approximate requests (or tokens) left per endpoint bucket.",
+           [("", {"endpoint": endpoint}, remaining) for endpoint, remaining in sorted(rate_limiter.remaining().items())])
+
+    counters = stage_metrics.counters()
+    metric("rugguard_gemini_tokens_total", "counter", "Gemini tokens reported by usage metadata.",
+           [("", {"kind": kind}, counters.get(f"gemini_{kind}_tokens", 0)) for kind in ("prompt", "output")])
+    metric("rugguard_gemini_early_stops_total", "counter", "Streamed generations cut off after the Trust Signal line.",
+           [("", {}, counters.get("gemini_early_stops", 0))])
+
+    histogram_samples, outcome_samples = [], []
+    for stage, data in sorted(stage_metrics.snapshot().items()):
+        cumulative = 0
+        for bound, count in data["buckets"]:
+            cumulative += count
+            histogram_samples.append(("_bucket", {"stage": stage, "le": "+Inf" if bound == float("inf") else bound}, cumulative))
+        histogram_samples.append(("_sum", {"stage": stage}, round(data["sum"], 6)))
+        histogram_samples.append(("_count", {"stage": stage}, data["count"]))
+        outcome_samples.extend(("", {"stage": stage, "outcome": outcome}, count) for outcome, count in sorted(data["outcomes"].items()))
+    metric("rugguard_stage_latency_seconds", "histogram", "Latency of each pipeline stage.", histogram_samples)
+    metric("rugguard_stage_outcomes_total", "counter", "Pipeline stage results by outcome.", outcome_samples)
+
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Starts the /metrics HTTP endpoint on a daemon thread when a port is configured."""
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serves GET /metrics; every other path is a 404."""
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus_metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # --- Scrapes every few seconds would drown the bot's own log lines ---
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="rugguard-metrics-http", daemon=True).start()
+    print(f"INFO: Prometheus metrics available on :{port}/metrics")
+    return server
+
+
+# ==============================================================================
+# 4. CLIENT INITIALIZATION: LAZY SDK IMPORTS
+# ==============================================================================
+class LazyModule:
+    """
+    Stands in for an SDK module and imports it on first attribute access, so CLI runs,
+    tests and forked workers that never touch an SDK do not pay for importing it.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+tweepy = LazyModule("tweepy")
+genai = LazyModule("google.generativeai")
+google_exceptions = LazyModule("google.api_core.exceptions")
+
+# --- Built on first use by get_x_client() / get_gemini_model(); tests and the bench may assign stand-ins. ---
+x_client = None
+gemini_model = None
+_x_client_lock = threading.Lock()
+_gemini_model_lock = threading.Lock()
+
+def get_x_client():
+    """Returns the shared rate-limited X client, importing tweepy and building it on first use."""
+    global x_client
+    if x_client is None:
+        with _x_client_lock:
+            if x_client is None:
+                try:
+                    x_client = build_rate_limited_client_class()(
+                        bearer_token=X_BEARER_TOKEN, consumer_key=X_API_KEY,
+                        consumer_secret=X_API_KEY_SECRET, access_token=X_ACCESS_TOKEN,
+                        access_token_secret=X_ACCESS_TOKEN_SECRET, wait_on_rate_limit=False
+                    )
+                except Exception as e:
+                    raise ConnectionError(f"Failed to initialize X client: {e}")
+                print("INFO: X client configured successfully.")
+    return x_client
+
+def get_gemini_model():
+    """Returns the shared Gemini model, importing google.generativeai and configuring it on first use."""
+    global gemini_model
+    if gemini_model is None:
+        with _gemini_model_lock:
+            if gemini_model is None:
+                try:
+                    genai.configure(api_key=GOOGLE_API_KEY)
+                    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+                except Exception as e:
+                    raise ConnectionError(f"Failed to initialize Google AI client: {e}")
+                print("INFO: Google AI client configured successfully.")
+    return gemini_model
+
+def warm_clients(builders=(get_x_client, get_gemini_model)) -> list:
+    """
+    Imports the SDKs and builds the clients on parallel threads while startup continues.
+    A caller that needs a client before its thread finishes just waits on the same lock.
+    """
+    threads = [threading.Thread(target=builder, name=f"rugguard-{builder.__name__}", daemon=True) for builder in builders]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def check_import_budget() -> float:
+    """
+    Warns when importing this module took longer than RUGGUARD_IMPORT_BUDGET_MS (0 disables the check).
+    """
+    elapsed_ms = (time.perf_counter() - IMPORT_STARTED) * 1000
+    if IMPORT_TIME_BUDGET_MS and elapsed_ms > IMPORT_TIME_BUDGET_MS:
+        print(f"WARNING: Importing main.py took {elapsed_ms:.0f} ms, over the {IMPORT_TIME_BUDGET_MS:.0f} ms budget; "
+              f"keep SDK imports and client setup out of module level.")
+    return elapsed_ms
+
+
+# ==============================================================================
+# 5. SHARED STATE: CACHES & PERSISTENT STORE
+# ==============================================================================
+class AnalysisCache:
+    """Thread-safe LRU cache of finished reports, keyed by target user ID, with a time-to-live."""
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Returns the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value):
+        """Stores a value, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key onto one execution whose result every caller shares."""
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """Runs fn() unless a call for key is already in flight, in which case waits for that one."""
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not is_leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+class AsyncSingleFlight:
+    """Event-loop counterpart of SingleFlight: one shared task per in-flight key."""
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+
+    async def do(self, key: str, coro_fn):
+        """Awaits coro_fn() unless a task for key is already running, in which case awaits that one."""
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        # --- Shielded so one cancelled waiter does not cancel the analysis for everyone else ---
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+class MicroBatcher:
+    """
+    Collects single-key lookups for up to `max_wait` seconds (or until `max_size` keys are pending)
+    and resolves them all with one bulk call. `fetch_batch(batch)` receives a {key: payload} dict and
+    must return a {key: value} dict; keys it leaves out resolve to None, a value that is an exception
+    fails only that lookup, and an exception raised by fetch_batch fails every lookup in the batch.
+    Up to `concurrency` batches are fetched at once; while every slot is busy, new keys keep collecting.
+    """
+    def __init__(self, name: str, fetch_batch, max_size: int, max_wait: float, concurrency: int = 1):
+        self.name = name
+        self.fetch_batch = fetch_batch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.keys_fetched = 0
+        self._pending = {}
+        self._payloads = {}
+        self._deadline = 0.0
+        self._ready = threading.Condition()
+        self._flusher = None
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+        self._executor = (
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"rugguard-batch-{name}")
+            if concurrency > 1 else None
+        )
+
+    def submit(self, key: str, payload=None) -> Future:
+        """Queues a lookup and returns a Future for its value; duplicate keys share one Future."""
+        with self._ready:
+            if future := self._pending.get(key):
+                return future
+            if not self._pending:
+                self._deadline = time.monotonic() + self.max_wait
+            future = self._pending[key] = Future()
+            self._payloads[key] = payload
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name=f"rugguard-batch-{self.name}", daemon=True)
+                self._flusher.start()
+            self._ready.notify()
+            return future
+
+    def _run(self):
+        while True:
+            # --- Wait for a free flush slot first, so a busy batcher packs the next batch fuller ---
+            self._slots.acquire()
+            with self._ready:
+                while not self._pending:
+                    self._ready.wait()
+                while len(self._pending) < self.max_size and (wait := self._deadline - time.monotonic()) > 0:
+                    self._ready.wait(wait)
+                keys = list(self._pending)[:self.max_size]
+                batch = {key: (self._pending.pop(key), self._payloads.pop(key)) for key in keys}
+                # --- Leftovers already waited a full window, so they go out with the next flush ---
+                self._deadline = time.monotonic()
+                self.batches += 1
+                self.keys_fetched += len(batch)
+            if self._executor:
+                self._executor.submit(self._flush, batch)
+            else:
+                self._flush(batch)
+
+    def _flush(self, batch: dict):
+        try:
+            results = self.fetch_batch({key: payload for key, (_, payload) in batch.items()})
+        except BaseException as e:
+            for future, _ in batch.values():
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for key, (future, _) in batch.items():
+            if isinstance(result := results.get(key), BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class AnalysisStore:
+    """
+    SQLite-backed store for compiled profiles, raw recent tweets, LLM verdicts and the trigger journal.
+    Runs in WAL mode and commits writes in batches; the file can be queried offline with any SQLite client.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            user_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            compiled_data TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tweets (
+            tweet_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tweets_by_user ON tweets (user_id);
+        CREATE TABLE IF NOT EXISTS verdicts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            trust_signal TEXT,
+            report TEXT NOT NULL,
+            analyzed_at REAL NOT NULL,
+            source TEXT NOT NULL DEFAULT 'llm',
+            skip_reason TEXT,
+            red_flags TEXT
+        );
+        CREATE INDEX IF NOT EXISTS verdicts_by_user ON verdicts (user_id, analyzed_at);
+        CREATE TABLE IF NOT EXISTS triggers (
+            tweet_id TEXT PRIMARY KEY,
+            job TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            received_at REAL NOT NULL,
+            finished_at REAL,
+            error TEXT,
+            report TEXT,
+            claimed_by TEXT,
+            claimed_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS triggers_by_status ON triggers (status, received_at);
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, commit_batch: int, commit_interval: float):
+        self.path = path
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+        self._conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._closed = threading.Event()
+        if commit_interval > 0:
+            threading.Thread(target=self._flush_periodically, name="rugguard-db-flush", daemon=True).start()
+
+    def _migrate(self):
+        """Adds columns introduced after a database file was first created."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(verdicts)")}
+        if "source" not in columns:
+            self._conn.execute("ALTER TABLE verdicts ADD COLUMN source TEXT NOT NULL DEFAULT 'llm'")
+        if "skip_reason" not in columns:
+            self._conn.execute("ALTER TABLE verdicts ADD COLUMN skip_reason TEXT")
+        if "red_flags" not in columns:
+            self._conn.execute("ALTER TABLE verdicts ADD COLUMN red_flags TEXT")
+        trigger_columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(triggers)")}
+        for column, column_type in [("report", "TEXT"), ("claimed_by", "TEXT"), ("claimed_until", "REAL"),
+                                    ("attempts", "INTEGER NOT NULL DEFAULT 0")]:
+            if column not in trigger_columns:
+                self._conn.execute(f"ALTER TABLE triggers ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+
+    def _write(self, sql: str, rows: list):
+        """Queues rows for the current batch and commits once the batch is full or old enough."""
+        with self._lock:
+            self._conn.executemany(sql, rows)
+            self._pending += len(rows)
+            if self._pending >= self.commit_batch or time.monotonic() - self._last_commit >= self.commit_interval:
+                self._commit_locked()
+
+    def _commit_locked(self):
+        self._conn.commit()
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def _flush_periodically(self):
+        """Commits a batch left half full by a quiet spell once it is commit_interval old."""
+        delay = self.commit_interval
+        while not self._closed.wait(delay):
+            with self._lock:
+                if self._closed.is_set():
+                    return
+                due = self._last_commit + self.commit_interval - time.monotonic()
+                if self._pending and due <= 0:
+                    self._commit_locked()
+                    due = self.commit_interval
+            delay = max(due, 0.05) if self._pending else self.commit_interval
+
+    def save_profile(self, user_id: str, compiled_data: dict, tweets):
+        """Stores the compiled profile snapshot and the raw recent tweets it was built from."""
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO profiles (user_id, username, compiled_data, fetched_at) VALUES (?, ?, ?, ?)",
+            [(str(user_id), compiled_data["username"], json.dumps(compiled_data), now)]
+        )
+        if tweets:
+            self._write(
+                "INSERT OR REPLACE INTO tweets (tweet_id, user_id, text, fetched_at) VALUES (?, ?, ?, ?)",
+                [(str(tweet.id), str(user_id), tweet.text, now) for tweet in tweets]
+            )
+
+    def save_verdict(self, user_id: str, username: str, summary: str, trust_signal, report: str,
+                     source: str = "llm", skip_reason: str = None, red_flags: list = None):
+        """Appends one finished analysis; older verdicts are kept as history. red_flags is stored as a JSON array."""
+        self._write(
+            "INSERT INTO verdicts (user_id, username, summary, trust_signal, report, analyzed_at, source, skip_reason,"
+            " red_flags) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(str(user_id), username, summary, trust_signal, report, time.time(), source, skip_reason,
+              json.dumps(red_flags) if red_flags is not None else None)]
+        )
+
+    def get_recent_verdict(self, user_id: str, max_age_seconds: float):
+        """Returns the newest verdict row for the user if it is younger than max_age_seconds, else None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM verdicts WHERE user_id = ? AND analyzed_at >= ? ORDER BY analyzed_at DESC LIMIT 1",
+                (str(user_id), time.time() - max_age_seconds)
+            ).fetchone()
+
+    def get_snapshot(self, user_id: str, max_age_seconds: float, tweet_limit: int):
+        """
+        Returns the inputs of the last full analysis for incremental re-analysis: the compiled profile,
+        the newest tweet_limit stored tweets (newest first) and the newest verdict row.
+        None when there is no verdict or the profile snapshot is older than max_age_seconds.
+        """
+        with self._lock:
+            profile = self._conn.execute(
+                "SELECT compiled_data FROM profiles WHERE user_id = ? AND fetched_at >= ?",
+                (str(user_id), time.time() - max_age_seconds)
+            ).fetchone()
+            verdict = self._conn.execute(
+                "SELECT * FROM verdicts WHERE user_id = ? ORDER BY analyzed_at DESC LIMIT 1", (str(user_id),)
+            ).fetchone()
+            tweets = self._conn.execute(
+                "SELECT tweet_id, text FROM tweets WHERE user_id = ? ORDER BY CAST(tweet_id AS INTEGER) DESC LIMIT ?",
+                (str(user_id), tweet_limit)
+            ).fetchall()
+        if profile is None or verdict is None:
+            return None
+        return {"profile": json.loads(profile["compiled_data"]), "tweets": tweets, "verdict": verdict}
+
+    # --- Trigger journal: unlike the batched writes above, every change is committed immediately ---
+    TRIGGER_KEYS = ("tweet_id", "original_tweet_id", "target_user_id")
+
+    def record_trigger(self, job: dict) -> bool:
+        """Durably journals an accepted trigger; returns False when the tweet was already seen."""
+        persisted = {key: job[key] for key in self.TRIGGER_KEYS if key in job}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO triggers (tweet_id, job, received_at) VALUES (?, ?, ?)",
+                (str(job["tweet_id"]), json.dumps(persisted), time.time())
+            )
+            self._commit_locked()
+        return cursor.rowcount == 1
+
+    def finish_trigger(self, tweet_id, status: str = "done", error: str = None):
+        """Marks a journaled trigger done (reply posted) or failed; neither is replayed."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE triggers SET status = ?, finished_at = ?, error = ?, claimed_by = NULL, claimed_until = NULL"
+                " WHERE tweet_id = ?",
+                (status, time.time(), error, str(tweet_id))
+            )
+            self._commit_locked()
+
+    def save_trigger_report(self, tweet_id, report: str):
+        """Stores the finished report and moves the trigger to 'analyzed', ready for the reply poster."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE triggers SET status = 'analyzed', report = ?, claimed_by = NULL, claimed_until = NULL"
+                " WHERE tweet_id = ?",
+                (report, str(tweet_id))
+            )
+            self._commit_locked()
+
+    def claim_trigger(self, status: str, worker: str, lease_seconds: float):
+        """
+        Atomically leases the oldest unclaimed trigger in `status` to `worker` and returns its job,
+        or None. A worker that dies loses its lease, and the trigger is claimed again once it expires.
+        """
+        token, now = f"{worker}:{time.monotonic_ns()}", time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE triggers SET claimed_by = ?, claimed_until = ? WHERE tweet_id = ("
+                " SELECT tweet_id FROM triggers WHERE status = ? AND (claimed_until IS NULL OR claimed_until < ?)"
+                " ORDER BY received_at LIMIT 1)",
+                (token, now + lease_seconds, status, now)
+            ).rowcount
+            self._commit_locked()
+            if not claimed:
+                return None
+            row = self._conn.execute("SELECT * FROM triggers WHERE claimed_by = ?", (token,)).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def defer_trigger(self, tweet_id, delay: float, error: str = None):
+        """
+        Keeps a claimed trigger out of reach for `delay` seconds. Passing the error of a failed
+        attempt also counts it towards the trigger's attempts.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE triggers SET claimed_by = NULL, claimed_until = ?, error = COALESCE(?, error),"
+                " attempts = attempts + ? WHERE tweet_id = ?",
+                (time.time() + delay, error, 1 if error else 0, str(tweet_id))
+            )
+            self._commit_locked()
+
+    def pending_triggers(self) -> list:
+        """
+        Returns the jobs accepted but never analyzed, oldest first, ready to be queued again.
+        Analyzed triggers keep their report on disk and are picked up by the reply outbox instead.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM triggers WHERE status = 'pending' ORDER BY received_at"
+            ).fetchall()
+        return [self._job_from_row(row) for row in rows]
+
+    @staticmethod
+    def _job_from_row(row) -> dict:
+        # --- received_at is rebased onto this process's monotonic clock, so end-to-end latency spans restarts ---
+        job = {**json.loads(row["job"]), "received_at": time.monotonic() - (time.time() - row["received_at"])}
+        job["attempts"] = row["attempts"]
+        if row["report"] is not None:
+            job["report"] = row["report"]
+        return job
+
+    def count_triggers(self) -> dict:
+        """Returns {status: count} over the trigger table, i.e. the broker backlog per stage."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM triggers GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def prune_triggers(self, max_age_seconds: float) -> int:
+        """Forgets finished triggers older than max_age_seconds; they are no longer needed for deduplication."""
+        with self._lock:
+            pruned = self._conn.execute(
+                "DELETE FROM triggers WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - max_age_seconds,)
+            ).rowcount
+            self._commit_locked()
+        return pruned
+
+    def get_state(self, key: str, default=None):
+        """Reads a small persisted bot setting, such as the mentions backfill since_id."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM bot_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_state(self, key: str, value: str):
+        """Persists a small bot setting and commits immediately."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, str(value), time.time())
+            )
+            self._commit_locked()
+
+    def flush(self):
+        """Commits any writes still waiting for their batch to fill."""
+        with self._lock:
+            if self._pending:
+                self._commit_locked()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+class LLMResponseCache:
+    """
+    Size-bounded on-disk cache of Gemini outputs, keyed by a hash of the model name, generation config
+    and rendered prompt. Once the stored responses exceed max_bytes, the least recently used are evicted.
+    Lives in its own SQLite file so lookups never wait on the store's batched transactions.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS llm_responses_by_use ON llm_responses (last_used_at);
+    """
+    EVICTION_CHUNK = 32
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def make_key(model_name: str, generation_config: dict, prompt: str) -> str:
+        payload = json.dumps([model_name, generation_config, prompt], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Returns the cached response text, or None."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Stores a response, then evicts least recently used entries until the cache fits in max_bytes."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode()), now, now)
+            )
+            while self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0] > self.max_bytes:
+                self.evictions += self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN"
+                    " (SELECT key FROM llm_responses WHERE key != ? ORDER BY last_used_at LIMIT ?)",
+                    (key, self.EVICTION_CHUNK)
+                ).rowcount or 0
+                if not self._conn.execute("SELECT COUNT(*) FROM llm_responses WHERE key != ?", (key,)).fetchone()[0]:
+                    break
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Finished reports keyed by str(user_id); repeat triggers for the same account reuse them. ---
+analysis_cache = AnalysisCache(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+
+# --- In-flight analyses keyed by str(user_id); concurrent triggers for one account share a single run. ---
+analysis_flights = SingleFlight()
+async_analysis_flights = AsyncSingleFlight()
+
+# --- Opened on first use by get_analysis_store() / get_llm_response_cache(), so importing creates no files ---
+analysis_store = None
+llm_response_cache = None
+_analysis_store_lock = threading.Lock()
+_llm_response_cache_lock = threading.Lock()
+
+def get_analysis_store() -> AnalysisStore:
+    """
+    Returns the persistent store, opening (and creating) the SQLite file on first use.
+    It survives restarts: profiles, tweets and verdicts are read back before going to the network.
+    """
+    global analysis_store
+    if analysis_store is None:
+        with _analysis_store_lock:
+            if analysis_store is None:
+                store = AnalysisStore(DB_PATH, DB_COMMIT_BATCH, DB_COMMIT_INTERVAL_SECONDS)
+                atexit.register(store.close)
+                analysis_store = store
+    return analysis_store
+
+def get_llm_response_cache():
+    """
+    Returns the Gemini response cache, opening its SQLite file on first use, or None when
+    RUGGUARD_LLM_CACHE_PATH is empty. Identical prompts reuse the earlier Gemini output.
+    """
+    global llm_response_cache
+    if llm_response_cache is None and LLM_CACHE_PATH:
+        with _llm_response_cache_lock:
+            if llm_response_cache is None:
+                cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES)
+                atexit.register(cache.close)
+                llm_response_cache = cache
+    return llm_response_cache
+
 
 # ==============================================================================
-# 2. CORE LOGIC: DATA GATHERING & LLM ANALYSIS
+# 6. CORE LOGIC: DATA GATHERING & LLM ANALYSIS
 # ==============================================================================
+# --- Fields requested for every analyzed profile and tweet timeline ---
+USER_FIELDS = ["created_at", "description", "public_metrics", "verified"]
+RECENT_TWEETS_PARAMS = {"max_results": 5, "exclude": ["retweets", "replies"]}
+LLM_ERROR_MESSAGE = "LLM analysis could not be performed due to an API error."
+TRUST_SIGNALS = ("Positive", "Neutral", "Caution", "Red Flag")
+TRUST_SIGNAL_PATTERN = re.compile(r"trust signal\W*(positive|neutral|caution|red flag)", re.IGNORECASE)
+
+URL_PATTERN = re.compile(r"https?://\S+")
+EMOJI_CHARS = "\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF"
+EMOJI_RUN_PATTERN = re.compile(f"([{EMOJI_CHARS}])[{EMOJI_CHARS}\ufe0f\u200d]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def clean_text(text: str, max_chars: int = PROMPT_MAX_TWEET_CHARS) -> str:
+    """
+    Strips URLs, collapses emoji runs to their first emoji and whitespace to single spaces,
+    then truncates to max_chars.
+    """
+    text = URL_PATTERN.sub("", text)
+    text = EMOJI_RUN_PATTERN.sub(r"\1", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
 
-def get_llm_analysis(user_data: dict) -> str:
+def compact_tweets(texts: list) -> list:
+    """Cleans tweet texts and drops empty and duplicate ones, keeping the newest-first order."""
+    seen, compacted = set(), []
+    for text in texts:
+        cleaned = clean_text(text)
+        if cleaned and cleaned.lower() not in seen:
+            seen.add(cleaned.lower())
+            compacted.append(cleaned)
+    return compacted
+
+# --- This prompt is the "brain" of your bot. Customize it to change the analysis. ---
+ANALYST_INSTRUCTIONS = (
+    "You are an expert crypto project analyst reviewing accounts on X (formerly Twitter). "
+    "Give a concise, neutral trustworthiness analysis based on the data below, looking for red flags "
+    "(spam, engagement farming, suspicious language) or positive signals (genuine interaction, clear project focus)."
+)
+
+TEXT_RESPONSE_INSTRUCTIONS = (
+    "Respond with one summary paragraph, then a final line \"Trust Signal: <signal>\" where <signal> is one of "
+    "Positive, Neutral, Caution or Red Flag. Nothing else."
+)
+JSON_RESPONSE_INSTRUCTIONS = (
+    'Respond with only a JSON object of the form {"summary": "<one paragraph>", "trust_signal": "<signal>", '
+    '"red_flags": ["<short phrase>", ...]} where <signal> is one of Positive, Neutral, Caution or Red Flag '
+    "and red_flags is empty when there are none."
+)
+
+def render_user_data(user_data: dict, max_tweets: int = None, max_bio_chars: int = PROMPT_MAX_TWEET_CHARS) -> str:
     """
-    Sends user data to the Gemini LLM for analysis and returns its summary.
+    Renders the data block for one compiled user record, optionally keeping only the newest max_tweets tweets.
     """
-    # --- This prompt is the "brain" of your bot. Customize it to change the analysis. ---
-    prompt = f"""
-    You are an expert crypto project analyst specializing in social media presence on X (formerly Twitter).
-    Your task is to provide a concise, neutral trustworthiness analysis of a user based on the data provided.
-    Focus on identifying potential red flags (e.g., spam, engagement farming, suspicious language) or positive signals (e.g., genuine interaction, clear project focus).
+    tweets = compact_tweets(user_data["recent_tweets"])[:max_tweets]
+    tweet_lines = "\n".join(f"- '{text}'" for text in tweets) or "No recent tweets found."
+    return (
+        f"Data for @{user_data['username']}:\n"
+        f"- Account age: {user_data['age_days']} days (created {user_data['created_at']})\n"
+        f"- Followers: {user_data['followers']}; following: {user_data['following']}; ratio: {user_data['follower_ratio']}\n"
+        f"- Verified: {'Yes' if user_data['is_verified'] else 'No'}\n"
+        f"- Bio: \"{clean_text(user_data['bio'], max_bio_chars)}\"\n"
+        f"- Recent tweets:\n{tweet_lines}"
+    )
 
-    **Data for User @{user_data['username']}:**
-    - **Account Age:** {user_data['age_days']} days (Created: {user_data['created_at']})
-    - **Follower Count:** {user_data['followers']}
-    - **Following Count:** {user_data['following']}
-    - **Follower/Following Ratio:** {user_data['follower_ratio']}
-    - **X Verified Status:** {'Yes' if user_data['is_verified'] else 'No'}
-    - **User Bio:** "{user_data['bio']}"
-    - **Recent Tweets:**
-    {user_data['recent_tweets']}
+def build_analysis_prompt(user_data: dict, max_tweets: int = None, max_bio_chars: int = PROMPT_MAX_TWEET_CHARS) -> str:
+    """
+    Renders the Gemini prompt for one compiled user record.
+    """
+    return (
+        f"{ANALYST_INSTRUCTIONS}\n\n"
+        f"{render_user_data(user_data, max_tweets, max_bio_chars)}\n\n"
+        f"{JSON_RESPONSE_INSTRUCTIONS if GEMINI_JSON_OUTPUT else TEXT_RESPONSE_INSTRUCTIONS}"
+    )
 
-    **Instructions:**
-    1. Write a one-paragraph summary of your findings.
-    2. Conclude with a final "Trust Signal" on a new line. The signal must be one of: Positive, Neutral, Caution, or Red Flag.
-    3. Your entire response should only be the summary paragraph and the Trust Signal line. Do not be conversational.
+def count_prompt_tokens(prompt: str) -> int:
+    """
+    Counts tokens with the model's count_tokens (paced by its own bucket), falling back to the local
+    estimate if that fails or the bucket is empty.
     """
-    
     try:
-        print(f"INFO: Sending data for @{user_data['username']} to Gemini API...")
-        response = gemini_model.generate_content(prompt)
-        return response.text.strip()
+        with stage_metrics.time("count_tokens"):
+            rate_limiter.acquire("gemini_count_tokens")
+            return get_gemini_model().count_tokens(prompt).total_tokens
+    except Exception as e:
+        print(f"WARNING: count_tokens failed, using local estimate: {e}")
+        return estimate_tokens(prompt)
+
+def fit_prompt_to_budget(user_data: dict) -> str:
+    """
+    Builds the prompt within PROMPT_TOKEN_BUDGET input tokens. The model's count_tokens is only
+    consulted when the local estimate is close to the budget; oldest tweets are dropped first,
+    then the bio is shortened. The full prompt is counted once, shorter ones are sized with the
+    measured tokens per character, and the chosen one is confirmed with at most one more call.
+    """
+    prompt = build_analysis_prompt(user_data)
+    if estimate_tokens(prompt) <= PROMPT_TOKEN_BUDGET * 0.8:
+        return prompt
+    if (tokens := count_prompt_tokens(prompt)) <= PROMPT_TOKEN_BUDGET:
+        return prompt
+
+    tokens_per_char = tokens / len(prompt)
+    remeasured = False
+    tweet_count = len(compact_tweets(user_data["recent_tweets"]))
+    for max_tweets in range(tweet_count - 1, -1, -1):
+        prompt = build_analysis_prompt(user_data, max_tweets=max_tweets)
+        if len(prompt) * tokens_per_char > PROMPT_TOKEN_BUDGET:
+            continue
+        if remeasured:
+            return prompt
+        # --- Still over after the confirming call: re-size with the ratio it measured, without another call ---
+        if (tokens := count_prompt_tokens(prompt)) <= PROMPT_TOKEN_BUDGET:
+            return prompt
+        tokens_per_char, remeasured = tokens / len(prompt), True
+    print(f"WARNING: Prompt for @{user_data['username']} exceeds the token budget even without tweets.")
+    return build_analysis_prompt(user_data, max_tweets=0, max_bio_chars=PROMPT_MAX_TWEET_CHARS // 2)
+
+def compile_user_data(user, tweets) -> dict:
+    """
+    Flattens an X user object and their recent tweets into the dict the LLM prompt is built from.
+    """
+    metrics = user.public_metrics
+    follower_ratio = metrics['followers_count'] / metrics['following_count'] if metrics['following_count'] > 0 else 0
+
+    return {
+        "username": user.username,
+        "age_days": (datetime.now(timezone.utc) - user.created_at).days,
+        "created_at": user.created_at.strftime('%b %Y'),
+        "followers": metrics['followers_count'],
+        "following": metrics['following_count'],
+        "follower_ratio": round(follower_ratio, 2),
+        "is_verified": user.verified,
+        "bio": user.description or "Not provided.",
+        "recent_tweets": [tweet.text for tweet in tweets or []]
+    }
+
+def parse_trust_signal(llm_summary: str):
+    """
+    Extracts the final Trust Signal from an LLM summary, normalized to one of TRUST_SIGNALS, or None.
+    """
+    matches = TRUST_SIGNAL_PATTERN.findall(llm_summary)
+    if not matches:
+        return None
+    return next(signal for signal in TRUST_SIGNALS if signal.lower() == matches[-1].lower())
+
+@dataclass(frozen=True)
+class LLMVerdict:
+    """
+    Typed verdict parsed from a JSON-mode Gemini response:
+    {"summary": str, "trust_signal": one of TRUST_SIGNALS, "red_flags": [str, ...]}.
+    """
+    summary: str
+    trust_signal: str
+    red_flags: tuple = ()
+
+    @classmethod
+    def from_dict(cls, data) -> "LLMVerdict":
+        """Validates one decoded verdict object; raises ValueError when it does not match the schema."""
+        if not isinstance(data, dict):
+            raise ValueError("verdict is not a JSON object")
+        summary, signal, red_flags = data.get("summary"), data.get("trust_signal"), data.get("red_flags", [])
+        if not isinstance(summary, str) or not summary.strip():
+            raise ValueError("verdict has no summary")
+        if not isinstance(signal, str):
+            raise ValueError("verdict has no trust_signal")
+        trust_signal = next((known for known in TRUST_SIGNALS if known.lower() == signal.strip().lower()), None)
+        if trust_signal is None:
+            raise ValueError(f"unknown trust_signal {signal!r}")
+        if not isinstance(red_flags, list) or not all(isinstance(flag, str) for flag in red_flags):
+            raise ValueError("red_flags is not a list of strings")
+        return cls(summary.strip(), trust_signal, tuple(flag.strip() for flag in red_flags if flag.strip()))
+
+    @classmethod
+    def from_json(cls, text: str) -> "LLMVerdict":
+        """Parses a JSON-mode response body; raises ValueError on invalid JSON or schema."""
+        return cls.from_dict(json.loads(text))
+
+    def to_text(self) -> str:
+        """Renders the verdict for the reply, ending in the same Trust Signal line as free-text mode."""
+        lines = [self.summary]
+        if self.red_flags:
+            lines.append(f"Red flags: {'; '.join(self.red_flags)}")
+        lines.append(f"Trust Signal: {self.trust_signal}")
+        return "\n".join(lines)
+
+def load_stored_report(user_id: str):
+    """
+    Returns a still-fresh report from the persistent store (warming the result cache), or None.
+    """
+    verdict = get_analysis_store().get_recent_verdict(user_id, VERDICT_MAX_AGE_SECONDS)
+    if verdict is None:
+        return None
+    print(f"INFO: Reusing stored verdict for user ID: {user_id} ({verdict['trust_signal']}).")
+    analysis_cache.put(str(user_id), verdict["report"])
+    return verdict["report"]
+
+def record_analysis(user_id: str, compiled_data: dict, tweets, llm_summary,
+                    source: str = "llm", skip_reason: str = None) -> str:
+    """
+    Formats the reply and, when the analysis succeeded, caches and persists the result.
+    llm_summary is either free text ending in a Trust Signal line or an LLMVerdict from JSON mode.
+    """
+    if isinstance(llm_summary, LLMVerdict):
+        summary, trust_signal, red_flags = llm_summary.to_text(), llm_summary.trust_signal, list(llm_summary.red_flags)
+    else:
+        summary, trust_signal, red_flags = llm_summary, None, None
+
+    report = format_report(compiled_data["username"], summary, source)
+    trust_signal = trust_signal or parse_trust_signal(summary)
+    # --- Only a verdict with a Trust Signal is cached, persisted and later reused as a snapshot ---
+    if summary != LLM_ERROR_MESSAGE and trust_signal is not None:
+        analysis_cache.put(str(user_id), report)
+        get_analysis_store().save_profile(user_id, compiled_data, tweets)
+        get_analysis_store().save_verdict(
+            user_id, compiled_data["username"], summary, trust_signal, report,
+            source=source, skip_reason=skip_reason, red_flags=red_flags
+        )
+    elif summary != LLM_ERROR_MESSAGE:
+        print(f"WARNING: Not storing the analysis of @{compiled_data['username']}: it has no Trust Signal.")
+    return report
+
+def format_report(username: str, llm_summary: str, source: str = "llm") -> str:
+    """Wraps the summary in the reply template posted on X; header and footer name the analysis source."""
+    if source == "llm":
+        title, analyzed_by = "LLM-Powered Analysis", "Gemini 1.5 Flash"
+    else:
+        title, analyzed_by = "Rule-Based Analysis", "rule-based fast path"
+    return (
+        f"🤖 {title} for @{username}\n"
+        f"-----------------------------------\n"
+        f"{llm_summary}\n"
+        f"-----------------------------------\n"
+        f"Analyzed by #ProjectRUGGUARD w/ {analyzed_by}"
+    )
+
+def load_previous_analysis(user_id: str):
+    """
+    Returns the stored snapshot behind the user's last LLM verdict (see AnalysisStore.get_snapshot), or None
+    when incremental mode is off, the last verdict did not come from the LLM or has no Trust Signal,
+    or the snapshot is too old.
+    """
+    if not INCREMENTAL_ENABLED:
+        return None
+    previous = get_analysis_store().get_snapshot(user_id, INCREMENTAL_MAX_AGE_SECONDS, RECENT_TWEETS_PARAMS["max_results"])
+    if previous is None or previous["verdict"]["source"] != "llm" or previous["verdict"]["trust_signal"] is None:
+        return None
+    return previous
+
+def recent_tweets_params(previous) -> dict:
+    """get_users_tweets parameters; with a previous snapshot only tweets newer than its newest one are requested."""
+    if previous and previous["tweets"]:
+        return {**RECENT_TWEETS_PARAMS, "since_id": previous["tweets"][0]["tweet_id"]}
+    return RECENT_TWEETS_PARAMS
+
+def merge_recent_tweets(compiled_data: dict, previous: dict):
+    """Tops the new tweets up with the stored ones, so the snapshot still holds the newest few."""
+    stored = [row["text"] for row in previous["tweets"]]
+    compiled_data["recent_tweets"] = (compiled_data["recent_tweets"] + stored)[:RECENT_TWEETS_PARAMS["max_results"]]
+
+def describe_profile_changes(before: dict, after: dict, new_tweets) -> list:
+    """
+    Lists the material differences between the last analyzed snapshot and fresh data; empty when
+    nothing material changed. Follower and following counts only count once they move by more
+    than RUGGUARD_INCREMENTAL_METRIC_CHANGE_PCT percent.
+    """
+    changes = []
+    if before.get("username") != after["username"]:
+        changes.append(f"Handle changed from @{before.get('username')} to @{after['username']}")
+    if bool(before.get("is_verified")) != bool(after["is_verified"]):
+        changes.append(f"Verified changed to {'Yes' if after['is_verified'] else 'No'}")
+    if before.get("bio") != after["bio"]:
+        changes.append(f"Bio changed to \"{clean_text(after['bio'])}\"")
+    for field, label in (("followers", "Followers"), ("following", "Following")):
+        old, new = before.get(field), after[field]
+        if not isinstance(old, int) or abs(new - old) > max(old, 1) * INCREMENTAL_METRIC_CHANGE_RATIO:
+            changes.append(f"{label} went from {old} to {new}")
+    if new_tweets:
+        changes.append(f"{len(new_tweets)} new tweet(s)")
+    return changes
+
+def build_delta_prompt(user_data: dict, previous: dict, changes: list, new_tweets) -> str:
+    """
+    Renders a short follow-up prompt: the previous conclusion, what changed since, and only the new tweets.
+    """
+    change_lines = "\n".join(f"- {change}" for change in changes)
+    tweet_lines = "\n".join(f"- '{text}'" for text in compact_tweets([tweet.text for tweet in new_tweets or []]))
+    return (
+        f"{ANALYST_INSTRUCTIONS}\n\n"
+        f"You previously analyzed @{user_data['username']} and concluded:\n{previous['verdict']['summary']}\n\n"
+        f"Since then:\n{change_lines}\n"
+        + (f"New tweets:\n{tweet_lines}\n" if tweet_lines else "")
+        + f"\nAccount is now {user_data['age_days']} days old with {user_data['followers']} followers "
+        f"(ratio {user_data['follower_ratio']}). Update the analysis in light of these changes, keeping the "
+        "earlier conclusion unless they justify revising it.\n\n"
+        f"{JSON_RESPONSE_INSTRUCTIONS if GEMINI_JSON_OUTPUT else TEXT_RESPONSE_INSTRUCTIONS}"
+    )
+
+def reuse_previous_verdict(user_id: str, compiled_data: dict, previous: dict) -> str:
+    """
+    Re-issues the last verdict when nothing material changed. The profile snapshot is left as it was,
+    so slow drift is still measured against the data the LLM actually saw.
+    """
+    verdict = previous["verdict"]
+    print(f"INFO: No material change for @{compiled_data['username']} since the last analysis; reusing its verdict.")
+    stage_metrics.increment("incremental_unchanged")
+    analysis_cache.put(str(user_id), verdict["report"])
+    get_analysis_store().save_verdict(
+        user_id, compiled_data["username"], verdict["summary"], verdict["trust_signal"], verdict["report"],
+        source=verdict["source"], skip_reason="unchanged since last analysis",
+        red_flags=json.loads(verdict["red_flags"]) if verdict["red_flags"] else None
+    )
+    return verdict["report"]
+
+def score_heuristically(user_data: dict):
+    """
+    Rule-based fast path for clear-cut accounts. Returns (summary, skip_reason) when the rules
+    are confident, with the summary ending in the same Trust Signal line the LLM produces;
+    returns None when the account needs the full LLM analysis.
+    """
+    if not HEURISTICS_ENABLED:
+        return None
+
+    if (user_data["age_days"] <= HEURISTIC_NEW_ACCOUNT_MAX_DAYS
+            and user_data["followers"] <= HEURISTIC_NEW_ACCOUNT_MAX_FOLLOWERS
+            and not user_data["is_verified"]):
+        reason = f"new account ({user_data['age_days']} days old, {user_data['followers']} followers, unverified)"
+        summary = (
+            f"@{user_data['username']} was created {user_data['age_days']} days ago, is not verified and has "
+            f"{user_data['followers']} followers. Brand-new accounts with no audience are a common pattern for "
+            f"scam and impersonation profiles; treat any claims from this account with extreme care.\n"
+            f"Trust Signal: Red Flag"
+        )
+        return summary, reason
+
+    if (user_data["is_verified"]
+            and user_data["age_days"] >= HEURISTIC_ESTABLISHED_MIN_DAYS
+            and user_data["followers"] >= HEURISTIC_ESTABLISHED_MIN_FOLLOWERS
+            and user_data["follower_ratio"] >= HEURISTIC_ESTABLISHED_MIN_RATIO):
+        reason = (f"established verified account ({user_data['age_days']} days old, "
+                  f"{user_data['followers']} followers, ratio {user_data['follower_ratio']})")
+        summary = (
+            f"@{user_data['username']} is a verified account active for {user_data['age_days'] // 365} years with "
+            f"{user_data['followers']} followers and a follower/following ratio of {user_data['follower_ratio']}. "
+            f"This long-standing, widely followed profile shows no structural red flags.\n"
+            f"Trust Signal: Positive"
+        )
+        return summary, reason
+
+    return None
+
+def plan_analysis(user_id: str, compiled_data: dict, tweets, previous: dict = None):
+    """
+    Decides how compiled data is scored; shared by the threaded and async pipelines, which only differ
+    in how they call Gemini. Returns (report, None) when no LLM call is needed: the heuristic fast path,
+    or an account unchanged since its previous snapshot reusing its last verdict. Otherwise returns
+    (None, delta_prompt), where delta_prompt is set for a changed account and None for a full analysis.
+    With a previous snapshot, tweets holds only the new tweets.
+    """
+    if previous:
+        merge_recent_tweets(compiled_data, previous)
+
+    if fast_path := score_heuristically(compiled_data):
+        summary, skip_reason = fast_path
+        print(f"INFO: Skipping LLM for @{compiled_data['username']}: {skip_reason}.")
+        return record_analysis(user_id, compiled_data, tweets, summary, source="heuristic", skip_reason=skip_reason), None
+
+    if not previous:
+        return None, None
+    if not (changes := describe_profile_changes(previous["profile"], compiled_data, tweets)):
+        return reuse_previous_verdict(user_id, compiled_data, previous), None
+    stage_metrics.increment("incremental_delta")
+    return None, build_delta_prompt(compiled_data, previous, changes, tweets)
+
+def analyze_compiled_data(user_id: str, compiled_data: dict, tweets, previous: dict = None) -> str:
+    """
+    Scores the compiled data as planned by plan_analysis(), calling the LLM when needed, and records the result.
+    """
+    report, delta_prompt = plan_analysis(user_id, compiled_data, tweets, previous)
+    if report:
+        return report
+
+    if delta_prompt:
+        llm_summary = get_llm_analysis(compiled_data, prompt=delta_prompt)
+    elif LLM_BATCH_SIZE > 1:
+        llm_summary = llm_batcher.submit(str(user_id), compiled_data).result()
+    else:
+        llm_summary = get_llm_analysis(compiled_data)
+    return record_analysis(user_id, compiled_data, tweets, llm_summary)
+
+def retryable_lookup_error(endpoint: str, error: Exception) -> RateLimited | None:
+    """
+    Maps a failed batch lookup to RateLimited when a later retry can succeed (X 5xx, timeouts, dropped
+    connections), so every job in the batch is deferred instead of failed. None for 4xx rejections.
+    """
+    if isinstance(error, RateLimited) or is_permanent_post_error(error):
+        return None
+    print(f"WARNING: {endpoint} batch failed ({error}); deferring its jobs for {X_LOOKUP_RETRY_SECONDS:.0f}s.")
+    return RateLimited(endpoint, X_LOOKUP_RETRY_SECONDS)
+
+def fetch_users_batch(batch: dict) -> dict:
+    """
+    Looks up to 100 profiles with a single get_users call, keyed by str(user.id).
+    """
+    user_ids = list(batch)
+    print(f"INFO: Fetching {len(user_ids)} profile(s) in one get_users call.")
+    try:
+        with stage_metrics.time("get_users"):
+            response = get_x_client().get_users(ids=user_ids, user_fields=USER_FIELDS)
+    except Exception as e:
+        if retry := retryable_lookup_error("get_users", e):
+            raise retry from e
+        raise
+    return {str(user.id): user for user in response.data or []}
+
+def fetch_tweet_authors_batch(batch: dict) -> dict:
+    """
+    Resolves the authors of up to 100 tweets with a single get_tweets call, keyed by str(tweet.id).
+    """
+    tweet_ids = list(batch)
+    print(f"INFO: Resolving {len(tweet_ids)} original tweet author(s) in one get_tweets call.")
+    try:
+        with stage_metrics.time("author_lookup"):
+            response = get_x_client().get_tweets(ids=tweet_ids, tweet_fields=["author_id"])
+    except Exception as e:
+        if retry := retryable_lookup_error("get_tweets", e):
+            raise retry from e
+        raise
+    return {str(tweet.id): tweet.author_id for tweet in response.data or []}
+
+# --- Profile and tweet-author lookups from concurrent workers are coalesced into bulk calls. ---
+user_lookup = MicroBatcher("get_users", fetch_users_batch, USER_BATCH_MAX_SIZE, USER_BATCH_WINDOW_SECONDS)
+tweet_author_lookup = MicroBatcher("get_tweets", fetch_tweet_authors_batch, TWEET_BATCH_MAX_SIZE, TWEET_BATCH_WINDOW_SECONDS)
+
+def record_gemini_usage(response):
+    """Adds the prompt/output token counts from a Gemini response's usage metadata, when present."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        stage_metrics.increment("gemini_prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+        stage_metrics.increment("gemini_output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+
+def add_stream_chunk(parts: list, chunk) -> bool:
+    """
+    Appends a streamed chunk's text to `parts`; returns True once the Trust Signal line is complete.
+    """
+    try:
+        parts.append(chunk.text)
+    except ValueError:
+        # --- Chunks without text parts (e.g. a finish-reason-only chunk) carry nothing to keep ---
+        return False
+    return TRUST_SIGNAL_PATTERN.search("".join(parts)) is not None
+
+def trim_after_trust_signal(text: str) -> str:
+    """Drops anything the model wrote after the Trust Signal line."""
+    match = TRUST_SIGNAL_PATTERN.search(text)
+    return (text[:match.end()] if match else text).strip()
+
+def stream_llm_summary(response, started: float) -> str:
+    """
+    Builds the summary from a streamed response, and stops reading as soon as the Trust Signal arrives.
+    """
+    parts, last_chunk = [], None
+    for chunk in response:
+        if last_chunk is None:
+            stage_metrics.observe("gemini_first_chunk", time.perf_counter() - started)
+        last_chunk = chunk
+        if add_stream_chunk(parts, chunk):
+            stage_metrics.increment("gemini_early_stops")
+            break
+    if last_chunk is not None:
+        record_gemini_usage(last_chunk)
+    return trim_after_trust_signal("".join(parts))
+
+def parse_llm_response(text: str):
+    """
+    Returns the free-text summary, or in JSON mode the validated LLMVerdict.
+    A JSON response that does not match the schema, or a free-text one without a Trust Signal
+    (including an empty or safety-blocked stream), is counted and reported as an LLM error.
+    """
+    if not GEMINI_JSON_OUTPUT:
+        if parse_trust_signal(text) is None:
+            stage_metrics.increment("gemini_missing_trust_signal")
+            print(f"ERROR: Gemini returned no Trust Signal ({len(text.strip())} characters of text).")
+            return LLM_ERROR_MESSAGE
+        return text.strip()
+    try:
+        return LLMVerdict.from_json(text)
+    except ValueError as e:
+        stage_metrics.increment("gemini_invalid_json")
+        print(f"ERROR: Gemini returned a response outside the verdict schema: {e}")
+        return LLM_ERROR_MESSAGE
+
+def current_generation_config() -> dict:
+    return LLM_JSON_GENERATION_CONFIG if GEMINI_JSON_OUTPUT else LLM_GENERATION_CONFIG
+
+def cached_llm_response(prompt: str):
+    """
+    Returns (cache_key, cached response text or None). The key covers the model name,
+    generation config and prompt, so a config change never serves a stale shape.
+    """
+    if (cache := get_llm_response_cache()) is None:
+        return None, None
+    key = LLMResponseCache.make_key(GEMINI_MODEL_NAME, current_generation_config(), prompt)
+    return key, cache.get(key)
+
+def remember_llm_response(cache_key, text: str):
+    """Parses a fresh Gemini output and caches it unless it turned out to be unusable."""
+    result = parse_llm_response(text)
+    if cache_key and result != LLM_ERROR_MESSAGE and text.strip():
+        get_llm_response_cache().put(cache_key, text)
+    return result
+
+def get_llm_analysis(user_data: dict, prompt: str = None):
+    """
+    Sends user data (or a prepared prompt about it) to the Gemini LLM for analysis and returns its summary
+    (an LLMVerdict in JSON mode). With streaming enabled, generation stops being read once the Trust Signal
+    line is complete. An identical earlier prompt is answered from the response cache without calling Gemini.
+    """
+    prompt = prompt or fit_prompt_to_budget(user_data)
+    cache_key, cached = cached_llm_response(prompt)
+    if cached is not None:
+        print(f"INFO: Reusing cached Gemini response for @{user_data['username']}.")
+        return parse_llm_response(cached)
+    try:
+        with stage_metrics.time("generate_content"):
+            acquire_gemini_quota(prompt)
+            print(f"INFO: Sending data for @{user_data['username']} to Gemini API...")
+            started = time.perf_counter()
+            if GEMINI_STREAMING and not GEMINI_JSON_OUTPUT:
+                response = get_gemini_model().generate_content(prompt, stream=True, generation_config=LLM_GENERATION_CONFIG)
+                text = stream_llm_summary(response, started)
+            else:
+                response = get_gemini_model().generate_content(prompt, generation_config=current_generation_config())
+                record_gemini_usage(response)
+                text = response.text
+        return remember_llm_response(cache_key, text)
+    except RateLimited:
+        raise
+    except google_exceptions.ResourceExhausted as e:
+        raise RateLimited("gemini_requests", GEMINI_QUOTA_RETRY_SECONDS) from e
     except Exception as e:
         print(f"ERROR: Gemini API call failed: {e}")
-        return "LLM analysis could not be performed due to an API error."
+        return LLM_ERROR_MESSAGE
+
+def build_batch_prompt(records: dict) -> str:
+    """
+    Packs several compiled user records into one prompt that asks for a JSON array of verdicts.
+    """
+    sections = "\n\n".join(f"[id: {key}]\n{render_user_data(user_data)}" for key, user_data in records.items())
+    return (
+        f"{ANALYST_INSTRUCTIONS}\n\n"
+        f"Analyze each of the following {len(records)} accounts independently.\n\n"
+        f"{sections}\n\n"
+        "Respond with only a JSON array containing one object per account, in the form "
+        '{"id": "<id>", "summary": "<one paragraph>", "trust_signal": "<signal>", "red_flags": ["<short phrase>", ...]}, '
+        "where <signal> is one of Positive, Neutral, Caution or Red Flag."
+    )
+
+def parse_batch_verdicts(text: str, expected_ids) -> dict:
+    """
+    Validates a batched JSON response and returns {id: LLMVerdict}.
+    Items outside the verdict schema are skipped; a response that is not a JSON array raises ValueError.
+    """
+    items = json.loads(text)
+    if not isinstance(items, list):
+        raise ValueError("batched response is not a JSON array")
+
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict) or str(item.get("id")) not in expected_ids:
+            continue
+        try:
+            verdicts[str(item["id"])] = LLMVerdict.from_dict(item)
+        except ValueError:
+            continue
+    return verdicts
+
+def get_llm_batch_analysis(batch: dict) -> dict:
+    """
+    Analyzes several compiled user records with one Gemini call and returns {key: summary}.
+    Records missing from (or invalid in) the batched answer fall back to single get_llm_analysis calls;
+    once a fallback is rate limited, the keys still missing map to that RateLimited while the verdicts
+    already parsed from the batched call are kept.
+    """
+    if len(batch) == 1:
+        return {key: get_llm_analysis(user_data) for key, user_data in batch.items()}
+
+    prompt = build_batch_prompt(batch)
+    verdicts = {}
+    try:
+        with stage_metrics.time("generate_content_batch"):
+            acquire_gemini_quota(prompt)
+            print(f"INFO: Sending {len(batch)} accounts to Gemini API in one batched request...")
+            response = get_gemini_model().generate_content(prompt, generation_config={
+                **LLM_BATCH_GENERATION_CONFIG,
+                "max_output_tokens": LLM_MAX_OUTPUT_TOKENS * len(batch),
+            })
+        record_gemini_usage(response)
+        verdicts = parse_batch_verdicts(response.text, set(batch))
+    except RateLimited:
+        raise
+    except google_exceptions.ResourceExhausted as e:
+        raise RateLimited("gemini_requests", GEMINI_QUOTA_RETRY_SECONDS) from e
+    except Exception as e:
+        print(f"WARNING: Batched Gemini analysis failed, falling back to single calls: {e}")
+
+    rate_limited = None
+    for key in batch.keys() - verdicts.keys():
+        if rate_limited:
+            verdicts[key] = rate_limited
+            continue
+        stage_metrics.increment("llm_batch_fallbacks")
+        try:
+            verdicts[key] = get_llm_analysis(batch[key])
+        except RateLimited as e:
+            verdicts[key] = rate_limited = e
+    return verdicts
+
+# --- With RUGGUARD_LLM_BATCH_SIZE > 1, LLM analyses of distinct targets are packed into shared Gemini calls. ---
+llm_batcher = MicroBatcher(
+    "gemini", get_llm_batch_analysis, LLM_BATCH_SIZE, LLM_BATCH_WINDOW_SECONDS, LLM_BATCH_CONCURRENCY
+)
 
 def get_user_data_and_analyze(user_id: str) -> str:
     """
     Gathers all data from X for a user, then passes it to the LLM for analysis.
+    Successful reports are served from the result cache until they expire, and
+    concurrent calls for the same user share a single in-flight analysis.
+    """
+    if cached_report := analysis_cache.get(str(user_id)):
+        print(f"INFO: Cache hit for user ID: {user_id}")
+        return cached_report
+
+    return analysis_flights.do(str(user_id), lambda: collect_and_analyze(user_id))
+
+def collect_and_analyze(user_id: str) -> str:
     """
+    Uncached pipeline behind get_user_data_and_analyze(): stored verdict, X lookups, LLM analysis, report.
+    """
+    if stored_report := load_stored_report(user_id):
+        return stored_report
+
     print(f"INFO: Starting data collection for user ID: {user_id}")
+    previous = load_previous_analysis(user_id)
     try:
+        # --- Queue the profile lookup for the next get_users batch ---
+        user_future = user_lookup.submit(str(user_id))
+
+        # --- Get user's recent tweets (only new ones after a previous analysis) while the batch window is open ---
+        with stage_metrics.time("get_users_tweets"):
+            tweets_response = get_x_client().get_users_tweets(id=user_id, **recent_tweets_params(previous))
+
         # --- Get user profile data ---
-        user_response = x_client.get_user(
-            id=user_id,
-            user_fields=["created_at", "description", "public_metrics", "verified"]
-        )
-        if not user_response.data: return "Analysis Failed: User not found."
-        user = user_response.data
-        
-        # --- Get user's recent tweets ---
-        tweets_response = x_client.get_users_tweets(id=user_id, max_results=5, exclude=["retweets", "replies"])
-        recent_tweets_text = "\n".join([f"- '{tweet.text}'" for tweet in tweets_response.data]) if tweets_response.data else "No recent tweets found."
+        user = user_future.result()
+        if not user: return "Analysis Failed: User not found."
 
         # --- Compile all data into a dictionary ---
-        metrics = user.public_metrics
-        follower_ratio = metrics['followers_count'] / metrics['following_count'] if metrics['following_count'] > 0 else 0
-        
-        compiled_data = {
-            "username": user.username,
-            "age_days": (datetime.now(timezone.utc) - user.created_at).days,
-            "created_at": user.created_at.strftime('%b %Y'),
-            "followers": metrics['followers_count'],
-            "following": metrics['following_count'],
-            "follower_ratio": round(follower_ratio, 2),
-            "is_verified": user.verified,
-            "bio": user.description or "Not provided.",
-            "recent_tweets": recent_tweets_text
+        compiled_data = compile_user_data(user, tweets_response.data)
+
+        # --- Score the compiled data (heuristic fast path or LLM) and format the final reply ---
+        return analyze_compiled_data(user_id, compiled_data, tweets_response.data, previous)
+
+    # --- Rate limits and transient get_users batch failures defer the job instead of failing it ---
+    except RateLimited:
+        raise
+    except Exception as e:
+        print(f"ERROR: An error occurred during data collection for user {user_id}: {e}")
+        return "Analysis Failed: Could not retrieve complete user data from X."
+
+# ==============================================================================
+# 7. WORKER POOL: TRIGGER PROCESSING OFF THE STREAM THREAD
+# ==============================================================================
+class JobQueue:
+    """
+    Bounded, thread-safe job queue where jobs can be deferred to a later time.
+    get() always hands out the earliest job that is ready, so a rate-limited job
+    waits in the queue while the jobs behind it keep flowing. Jobs count as active from
+    put_nowait() until done(), so a journal re-sweep never queues a trigger twice.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._heap = []
+        self._active = set()
+        self._sequence = itertools.count()
+        self._ready = threading.Condition()
+
+    def _push(self, job: dict, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), job))
+        self._ready.notify()
+
+    def put_nowait(self, job: dict) -> bool:
+        """
+        Adds a new job, raising queue.Full when the queue is at capacity.
+        Returns False when the same trigger is already queued or being processed.
+        """
+        with self._ready:
+            key = str(job["tweet_id"])
+            if key in self._active:
+                return False
+            if len(self._heap) >= self.maxsize:
+                self.overflowed = True
+                raise queue.Full
+            self._active.add(key)
+            self._push(job, 0.0)
+            return True
+
+    def defer(self, job: dict, delay: float):
+        """Puts an already-accepted job back, runnable again after `delay` seconds."""
+        with self._ready:
+            self._push(job, delay)
+
+    def get(self) -> dict:
+        """Blocks until a job is ready and returns it."""
+        with self._ready:
+            while True:
+                if not self._heap:
+                    self._ready.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait <= 0:
+                    return heapq.heappop(self._heap)[2]
+                self._ready.wait(wait)
+
+    def done(self, job: dict) -> bool:
+        """
+        Forgets a finished or failed job. Returns True (once) when the queue has overflowed since
+        the last re-sweep and has now drained to half its size.
+        """
+        with self._ready:
+            self._active.discard(str(job["tweet_id"]))
+            if self.overflowed and len(self._heap) <= self.maxsize // 2:
+                self.overflowed = False
+                return True
+            return False
+
+    def qsize(self) -> int:
+        with self._ready:
+            return len(self._heap)
+
+# --- Bounded queue of pending triggers. Each job is a dict describing one trigger tweet. ---
+job_queue = JobQueue(maxsize=JOB_QUEUE_SIZE)
+
+def parse_trigger(tweet: tweepy.Tweet, includes: dict = None):
+    """
+    Returns a trigger job dict when the tweet is a reply containing the trigger phrase, else None.
+    When the stream's includes already carry the replied-to tweet, its author is filled in too.
+    """
+    is_reply = tweet.referenced_tweets and tweet.referenced_tweets[0].type == 'replied_to'
+    if not (is_reply and TRIGGER_PHRASE.lower() in tweet.text.lower()):
+        return None
+
+    job = {
+        "tweet_id": tweet.id,
+        "original_tweet_id": tweet.referenced_tweets[0].id,
+        "received_at": time.monotonic(),
+    }
+    for included_tweet in (includes or {}).get("tweets", []):
+        if included_tweet.id == job["original_tweet_id"] and included_tweet.author_id:
+            job["target_user_id"] = included_tweet.author_id
+    return job
+
+def accept_trigger(job: dict) -> bool:
+    """
+    Journals a freshly parsed trigger before it is queued. Returns False for a tweet that was
+    already accepted, e.g. redelivered by the stream after a reconnect.
+    """
+    if not get_analysis_store().record_trigger(job):
+        print(f"INFO: Trigger tweet {job['tweet_id']} was already accepted; skipping duplicate.")
+        return False
+    return True
+
+def replay_pending_triggers(submit) -> int:
+    """
+    Hands every journaled but unfinished trigger to `submit` (e.g. enqueue_trigger) after a restart.
+    """
+    pruned = get_analysis_store().prune_triggers(TRIGGER_RETENTION_SECONDS)
+    jobs = get_analysis_store().pending_triggers()
+    for job in jobs:
+        submit(job)
+    if jobs or pruned:
+        print(f"INFO: Replayed {len(jobs)} unfinished trigger(s) from the journal ({pruned} old entries pruned).")
+    return len(jobs)
+
+def enqueue_trigger(job: dict) -> bool:
+    """
+    Hands a trigger job to the worker pool without blocking the caller.
+    Returns False when the queue is full; the job stays pending in the journal and is
+    queued again by resweep_pending_triggers() once the queue has drained.
+    """
+    try:
+        job_queue.put_nowait(job)
+        return True
+    except queue.Full:
+        print(f"ERROR: Job queue full ({JOB_QUEUE_SIZE}), dropping trigger tweet {job['tweet_id']}.")
+        return False
+
+def resweep_pending_triggers() -> int:
+    """
+    Queues the journaled triggers that were dropped while the queue was full, until it fills up again.
+    """
+    requeued = 0
+    for job in get_analysis_store().pending_triggers():
+        try:
+            requeued += job_queue.put_nowait(job)
+        except queue.Full:
+            break
+    print(f"INFO: Re-queued {requeued} trigger(s) dropped while the job queue was full.")
+    return requeued
+
+def analyze_trigger(job: dict):
+    """
+    Resolves the author of the original tweet and stores the finished report on the job.
+    Each finished stage is kept on the job, so a deferred job resumes where it was rate limited.
+    """
+    if "target_user_id" not in job:
+        target_user_id = tweet_author_lookup.submit(str(job["original_tweet_id"])).result()
+        if not target_user_id:
+            raise Exception("Original author ID not found.")
+        job["target_user_id"] = target_user_id
+
+    if "report" not in job:
+        job["report"] = get_user_data_and_analyze(job["target_user_id"])
+
+def post_reply(job: dict):
+    """Replies to the trigger tweet with the finished report and marks the trigger done."""
+    with stage_metrics.time("create_tweet"):
+        get_x_client().create_tweet(text=job["report"], in_reply_to_tweet_id=job["tweet_id"])
+    get_analysis_store().finish_trigger(job["tweet_id"])
+    print(f"INFO: Reply sent successfully for tweet {job['tweet_id']}.")
+
+def process_trigger(job: dict):
+    """
+    Resolves the author of the original tweet, analyzes them and hands the report to the reply outbox.
+    The report is persisted first, so a failed post never costs a second analysis.
+    """
+    analyze_trigger(job)
+    get_analysis_store().save_trigger_report(job["tweet_id"], job["report"])
+    reply_outbox.notify()
+
+def reply_retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the `attempt`-th failed post (1-based)."""
+    return random.uniform(0, min(REPLY_RETRY_MAX_SECONDS, REPLY_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+def is_permanent_post_error(error: Exception) -> bool:
+    """X rejections other than 429 (e.g. duplicate content, deleted tweet) will not succeed on retry."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return isinstance(error, tweepy.HTTPException) and status is not None and 400 <= status < 500 and status != 429
+
+class ReplyOutbox:
+    """
+    Posts finished reports ('analyzed' rows of the trigger table) from one dedicated thread.
+    Posts are paced by the create_tweet bucket and RUGGUARD_REPLY_MIN_INTERVAL_MS; transient
+    failures are retried with jittered backoff, and unsent replies survive restarts on disk.
+    """
+    def __init__(self, name: str, min_interval: float, max_attempts: int):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._last_post = 0.0
+        self._paused_until = 0.0
+        self._thread = None
+
+    def notify(self):
+        """Wakes the poster early when a new report is ready (same process only)."""
+        self._wake.set()
+
+    def post_next(self) -> bool:
+        """Posts the oldest ready reply, if any. Returns False when nothing was ready."""
+        # --- A rate-limit pause is a deadline, so notify() from new reports cannot cut it short ---
+        if (pause := self._paused_until - time.monotonic()) > 0:
+            time.sleep(pause)
+        job = get_analysis_store().claim_trigger("analyzed", self.name, BROKER_LEASE_SECONDS)
+        if job is None:
+            return False
+
+        if (wait := self._last_post + self.min_interval - time.monotonic()) > 0:
+            time.sleep(wait)
+        try:
+            post_reply(job)
+            stage_metrics.observe("end_to_end", time.monotonic() - job["received_at"])
+        except RateLimited as e:
+            print(f"WARNING: {e}; pausing replies for {e.retry_after:.1f}s.")
+            get_analysis_store().defer_trigger(job["tweet_id"], e.retry_after)
+            self._paused_until = time.monotonic() + e.retry_after
+        except Exception as e:
+            attempt = job["attempts"] + 1
+            if is_permanent_post_error(e) or attempt >= self.max_attempts:
+                stage_metrics.observe("end_to_end", time.monotonic() - job["received_at"], "error")
+                get_analysis_store().finish_trigger(job["tweet_id"], "failed", str(e))
+                print(f"ERROR: Giving up on the reply to tweet {job['tweet_id']} after {attempt} attempt(s): {e}")
+            else:
+                delay = reply_retry_delay(attempt)
+                stage_metrics.increment("reply_retries")
+                get_analysis_store().defer_trigger(job["tweet_id"], delay, str(e))
+                print(f"WARNING: Reply to tweet {job['tweet_id']} failed ({e}); retrying in {delay:.1f}s.")
+        finally:
+            self._last_post = time.monotonic()
+        return True
+
+    def run_forever(self):
+        # --- Same backoff as drain_broker(): a locked database must not end the poster thread ---
+        backoff = BROKER_POLL_SECONDS
+        while True:
+            try:
+                posted = self.post_next()
+                backoff = BROKER_POLL_SECONDS
+            except Exception as e:
+                stage_metrics.increment("broker_errors")
+                print(f"ERROR: {self.name} could not use the trigger broker: {e}; retrying in {backoff:.1f}s.")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, BROKER_ERROR_MAX_BACKOFF_SECONDS)
+                continue
+            if not posted:
+                self._wake.wait(BROKER_POLL_SECONDS)
+                self._wake.clear()
+
+    def start(self):
+        """Starts the poster thread once; later calls are no-ops."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name="rugguard-reply-outbox", daemon=True)
+            self._thread.start()
+        return self._thread
+
+# --- Single poster per process; in multi-process mode only the poster process runs it. ---
+reply_outbox = ReplyOutbox(f"outbox@{os.getpid()}", REPLY_MIN_INTERVAL_SECONDS, REPLY_MAX_ATTEMPTS)
+
+def worker_loop():
+    """Pulls trigger jobs off the queue forever, isolating failures per job."""
+    while True:
+        job = job_queue.get()
+        try:
+            process_trigger(job)
+        except RateLimited as e:
+            print(f"WARNING: {e}; deferring trigger tweet {job['tweet_id']}.")
+            job_queue.defer(job, e.retry_after)
+            continue
+        except Exception as e:
+            stage_metrics.observe("end_to_end", time.monotonic() - job["received_at"], "error")
+            get_analysis_store().finish_trigger(job["tweet_id"], "failed", str(e))
+            print(f"ERROR: Failed to process trigger for tweet {job['tweet_id']}: {e}")
+        # --- Triggers dropped by a full queue wait in the journal until it has drained to half ---
+        if job_queue.done(job):
+            resweep_pending_triggers()
+
+def start_workers(count: int = WORKER_COUNT) -> list:
+    """Starts the daemon worker threads that drain the job queue, and the reply outbox they feed."""
+    workers = [
+        threading.Thread(target=worker_loop, name=f"rugguard-worker-{i}", daemon=True)
+        for i in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    reply_outbox.start()
+    print(f"INFO: Started {count} analysis workers (queue size {JOB_QUEUE_SIZE}).")
+    return workers
+
+
+# ==============================================================================
+# 8. X API STREAM LISTENER
+# ==============================================================================
+@functools.lru_cache(maxsize=None)
+def build_listener_class():
+    """
+    Builds the StreamingClient subclass on first use, so importing this module does not import tweepy.
+    """
+    class BotStreamListener(tweepy.StreamingClient):
+        """
+        Monitors the X stream and hands trigger tweets to `submit` (the worker pool by default).
+        """
+        def __init__(self, submit=None, **kwargs):
+            super().__init__(**kwargs)
+            self.submit = submit or enqueue_trigger
+            print("INFO: Listener active, monitoring X stream...")
+
+        def on_response(self, response: tweepy.StreamResponse):
+            # --- on_data calls on_tweet before the includes are parsed, so triggers are handled here, once per tweet ---
+            if response.data:
+                self.handle_tweet(response.data, response.includes)
+
+        def handle_tweet(self, tweet: tweepy.Tweet, includes: dict = None):
+            # --- Only parse, journal and enqueue here; the stream must never wait on X REST or Gemini. ---
+            if (job := parse_trigger(tweet, includes)) and accept_trigger(job):
+                print(f"INFO: Trigger detected in tweet {job['tweet_id']}. Queuing analysis.")
+                self.submit(job)
+
+        def on_connect(self):
+            # --- Every (re)connect backfills the mentions posted while the stream was down ---
+            super().on_connect()
+            start_backfill(self.submit)
+
+        def on_error(self, status):
+            print(f"ERROR: Stream error with status code: {status}")
+
+    return BotStreamListener
+
+def desired_stream_rules() -> list:
+    """The filtered-stream rules this bot needs; anything else found at startup is removed."""
+    return [tweepy.StreamRule(STREAM_RULE)]
+
+def diff_stream_rules(existing: list, desired: list):
+    """
+    Compares the stream's current rules with the desired ones by (value, tag).
+    Returns (rules_to_add, rule_ids_to_delete); both are empty when nothing changed.
+    """
+    def rule_key(rule):
+        return rule.value, rule.tag or None
+
+    existing_keys = {rule_key(rule) for rule in existing}
+    desired_keys = {rule_key(rule) for rule in desired}
+    to_add = [rule for rule in desired if rule_key(rule) not in existing_keys]
+    to_delete = [rule.id for rule in existing if rule_key(rule) not in desired_keys]
+    return to_add, to_delete
+
+def sync_stream_rules(listener: tweepy.StreamingClient):
+    """
+    Brings the stream rules in line with desired_stream_rules(), changing only what differs.
+    New rules are added before stale ones are deleted, so the trigger rule is never absent.
+    """
+    to_add, to_delete = diff_stream_rules(listener.get_rules().data or [], desired_stream_rules())
+    if to_add:
+        listener.add_rules(to_add)
+        print(f"INFO: Stream rules added: {[rule.value for rule in to_add]}")
+    if to_delete:
+        listener.delete_rules(to_delete)
+        print(f"INFO: {len(to_delete)} stale stream rule(s) removed.")
+    if not to_add and not to_delete:
+        print(f"INFO: Stream rule already set: '{STREAM_RULE}'")
+
+
+# ==============================================================================
+# 9. MENTIONS BACKFILL: POLLING FALLBACK FOR STREAM GAPS
+# ==============================================================================
+BACKFILL_SINCE_ID_KEY = "mentions_since_id"
+BACKFILL_RESUME_KEY = "mentions_backfill_resume"
+_backfill_lock = threading.Lock()
+_bot_user_id = None
+
+def get_bot_user_id():
+    """Resolves (once) the numeric ID of BOT_USERNAME, which get_users_mentions needs."""
+    global _bot_user_id
+    if _bot_user_id is None:
+        _bot_user_id = get_x_client().get_user(username=BOT_USERNAME).data.id
+    return _bot_user_id
+
+def backfill_mentions(submit=enqueue_trigger) -> int:
+    """
+    Pages through the bot's mentions timeline from the persisted since_id and hands every new
+    trigger to `submit`, exactly like the stream listener. Triggers the stream already delivered
+    are dropped by the trigger journal. Pages run newest to oldest, so the since_id only advances
+    once the whole gap has been read; a pass that hits RUGGUARD_BACKFILL_MAX_PAGES persists the
+    oldest ID it reached and the next pass continues below it (until_id) with the same lower bound.
+    On the very first run the lookback is capped at RUGGUARD_BACKFILL_LOOKBACK_SECONDS.
+    Returns the number of triggers queued, or 0 when another backfill is already running.
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        return 0
+    try:
+        since_id = get_analysis_store().get_state(BACKFILL_SINCE_ID_KEY)
+        resume = json.loads(get_analysis_store().get_state(BACKFILL_RESUME_KEY) or "{}")
+        params = {
+            "max_results": BACKFILL_PAGE_SIZE,
+            "expansions": STREAM_EXPANSIONS,
+            "tweet_fields": STREAM_TWEET_FIELDS,
         }
+        if since_id:
+            params["since_id"] = since_id
+        else:
+            params["start_time"] = resume.get("start_time") or datetime.fromtimestamp(
+                time.time() - BACKFILL_FIRST_RUN_LOOKBACK_SECONDS, timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if oldest_id := resume.get("until_id"):
+            params["until_id"] = oldest_id
+            print(f"INFO: Resuming the unfinished mentions backfill below tweet {oldest_id}.")
 
-        # --- Send the compiled data for LLM analysis ---
-        llm_summary = get_llm_analysis(compiled_data)
-        
-        # --- Format the final reply ---
-        return (
-            f"🤖 LLM-Powered Analysis for @{user.username}\n"
-            f"-----------------------------------\n"
-            f"{llm_summary}\n"
-            f"-----------------------------------\n"
-            f"Analyzed by #ProjectRUGGUARD w/ Gemini 1.5 Flash"
+        newest_id, queued, pages, pagination_token = resume.get("newest_id") or since_id, 0, 0, None
+        while pages < BACKFILL_MAX_PAGES:
+            with stage_metrics.time("get_users_mentions"):
+                response = get_x_client().get_users_mentions(
+                    get_bot_user_id(), pagination_token=pagination_token, **params
+                )
+            pages += 1
+            for tweet in response.data or []:
+                if newest_id is None or int(tweet.id) > int(newest_id):
+                    newest_id = str(tweet.id)
+                if oldest_id is None or int(tweet.id) < int(oldest_id):
+                    oldest_id = str(tweet.id)
+                if (job := parse_trigger(tweet, response.includes)) and accept_trigger(job):
+                    submit(job)
+                    queued += 1
+            pagination_token = (response.meta or {}).get("next_token")
+            if not pagination_token:
+                break
+
+        if pagination_token:
+            get_analysis_store().set_state(BACKFILL_RESUME_KEY, json.dumps(
+                {"newest_id": newest_id, "until_id": oldest_id, "start_time": params.get("start_time")}
+            ))
+            print(f"WARNING: Mentions backfill stopped after {pages} pages; the next pass continues below tweet {oldest_id}.")
+        else:
+            if newest_id and newest_id != since_id:
+                get_analysis_store().set_state(BACKFILL_SINCE_ID_KEY, newest_id)
+            if resume:
+                get_analysis_store().set_state(BACKFILL_RESUME_KEY, "{}")
+        stage_metrics.increment("backfill_triggers", queued)
+        if queued:
+            print(f"INFO: Mentions backfill queued {queued} missed trigger(s) from {pages} page(s).")
+        return queued
+    except RateLimited as e:
+        print(f"WARNING: Mentions backfill paused: {e}")
+        return 0
+    except Exception as e:
+        print(f"ERROR: Mentions backfill failed: {e}")
+        return 0
+    finally:
+        _backfill_lock.release()
+
+def start_backfill(submit=enqueue_trigger):
+    """Runs one backfill pass on a daemon thread, so the stream thread is never blocked."""
+    if not BACKFILL_ENABLED:
+        return None
+    thread = threading.Thread(target=backfill_mentions, args=(submit,), name="rugguard-backfill", daemon=True)
+    thread.start()
+    return thread
+
+def start_mentions_poller(submit=enqueue_trigger, interval: float = BACKFILL_INTERVAL_SECONDS):
+    """Polls the mentions timeline every `interval` seconds as a fallback to the stream (0 disables it)."""
+    if not BACKFILL_ENABLED or interval <= 0:
+        return None
+
+    def poll_forever():
+        while True:
+            time.sleep(interval)
+            backfill_mentions(submit)
+
+    poller = threading.Thread(target=poll_forever, name="rugguard-mentions-poller", daemon=True)
+    poller.start()
+    return poller
+
+
+# ==============================================================================
+# 10. ASYNCIO PIPELINE MODE
+# ==============================================================================
+# --- Async clients are created inside the running event loop by run_async_bot(). ---
+x_async_client = None
+x_semaphore = None
+gemini_semaphore = None
+
+async def call_x_async(method: str, *args, **kwargs):
+    """
+    Calls one AsyncClient method while holding a slot of the X API semaphore. The call is paced
+    by the endpoint's token bucket; a 429 parks only this coroutine until the window resets,
+    even when the headers still report requests left (another cap, such as a daily one, was hit).
+    """
+    while True:
+        await rate_limiter.acquire_async(method)
+        async with x_semaphore:
+            try:
+                with stage_metrics.time(method):
+                    return await getattr(x_async_client, method)(*args, **kwargs)
+            except tweepy.TooManyRequests as e:
+                headers = getattr(e.response, "headers", None)
+                rate_limiter.update_from_headers(method, headers)
+                retry_after = retry_after_429(headers)
+        print(f"WARNING: {method} rate limited; waiting {retry_after:.0f}s for the window to reset.")
+        await asyncio.sleep(retry_after)
+
+async def stream_llm_summary_async(response, started: float) -> str:
+    """
+    Async twin of stream_llm_summary().
+    """
+    parts, last_chunk = [], None
+    async for chunk in response:
+        if last_chunk is None:
+            stage_metrics.observe("gemini_first_chunk", time.perf_counter() - started)
+        last_chunk = chunk
+        if add_stream_chunk(parts, chunk):
+            stage_metrics.increment("gemini_early_stops")
+            break
+    if last_chunk is not None:
+        record_gemini_usage(last_chunk)
+    return trim_after_trust_signal("".join(parts))
+
+async def get_llm_analysis_async(user_data: dict, prompt: str = None):
+    """
+    Async twin of get_llm_analysis(), capped by the Gemini semaphore.
+    """
+    prompt = prompt or await asyncio.to_thread(fit_prompt_to_budget, user_data)
+    cache_key, cached = await asyncio.to_thread(cached_llm_response, prompt)
+    if cached is not None:
+        print(f"INFO: Reusing cached Gemini response for @{user_data['username']}.")
+        return parse_llm_response(cached)
+    try:
+        while True:
+            await acquire_gemini_quota_async(prompt)
+            print(f"INFO: Sending data for @{user_data['username']} to Gemini API...")
+            try:
+                async with gemini_semaphore:
+                    with stage_metrics.time("generate_content"):
+                        started = time.perf_counter()
+                        if GEMINI_STREAMING and not GEMINI_JSON_OUTPUT:
+                            response = await get_gemini_model().generate_content_async(
+                                prompt, stream=True, generation_config=LLM_GENERATION_CONFIG
+                            )
+                            text = await stream_llm_summary_async(response, started)
+                        else:
+                            response = await get_gemini_model().generate_content_async(
+                                prompt, generation_config=current_generation_config()
+                            )
+                            record_gemini_usage(response)
+                            text = response.text
+                return await asyncio.to_thread(remember_llm_response, cache_key, text)
+            except google_exceptions.ResourceExhausted:
+                print(f"WARNING: Gemini quota exhausted; retrying in {GEMINI_QUOTA_RETRY_SECONDS:.0f}s.")
+                await asyncio.sleep(GEMINI_QUOTA_RETRY_SECONDS)
+    except Exception as e:
+        print(f"ERROR: Gemini API call failed: {e}")
+        return LLM_ERROR_MESSAGE
+
+async def get_user_data_and_analyze_async(user_id: str) -> str:
+    """
+    Async twin of get_user_data_and_analyze().
+    """
+    if cached_report := analysis_cache.get(str(user_id)):
+        print(f"INFO: Cache hit for user ID: {user_id}")
+        return cached_report
+
+    return await async_analysis_flights.do(str(user_id), lambda: collect_and_analyze_async(user_id))
+
+async def collect_and_analyze_async(user_id: str) -> str:
+    """
+    Async twin of collect_and_analyze(). The profile and timeline lookups run concurrently;
+    SQLite reads and writes run in worker threads so they never block the event loop.
+    """
+    if stored_report := await asyncio.to_thread(load_stored_report, user_id):
+        return stored_report
+
+    print(f"INFO: Starting data collection for user ID: {user_id}")
+    previous = await asyncio.to_thread(load_previous_analysis, user_id)
+    try:
+        user_response, tweets_response = await asyncio.gather(
+            call_x_async("get_user", id=user_id, user_fields=USER_FIELDS),
+            call_x_async("get_users_tweets", id=user_id, **recent_tweets_params(previous)),
         )
-        
+        if not user_response.data: return "Analysis Failed: User not found."
+        user = user_response.data
+
+        tweets = tweets_response.data
+        compiled_data = compile_user_data(user, tweets)
+        report, delta_prompt = await asyncio.to_thread(plan_analysis, user_id, compiled_data, tweets, previous)
+        if report:
+            return report
+
+        llm_summary = await get_llm_analysis_async(compiled_data, prompt=delta_prompt)
+        return await asyncio.to_thread(record_analysis, user_id, compiled_data, tweets, llm_summary)
+
     except Exception as e:
         print(f"ERROR: An error occurred during data collection for user {user_id}: {e}")
         return "Analysis Failed: Could not retrieve complete user data from X."
 
+async def process_trigger_async(job: dict):
+    """
+    Async twin of process_trigger().
+    """
+    try:
+        target_user_id = job.get("target_user_id")
+        if not target_user_id:
+            response = await call_x_async("get_tweet", job["original_tweet_id"], expansions=["author_id"])
+            target_user_id = response.data.author_id
+        if not target_user_id:
+            raise Exception("Original author ID not found.")
+
+        final_report = await get_user_data_and_analyze_async(target_user_id)
+        await asyncio.to_thread(get_analysis_store().save_trigger_report, job["tweet_id"], final_report)
+        reply_outbox.notify()
+    except Exception as e:
+        stage_metrics.observe("end_to_end", time.monotonic() - job["received_at"], "error")
+        await asyncio.to_thread(get_analysis_store().finish_trigger, job["tweet_id"], "failed", str(e))
+        print(f"ERROR: Failed to process trigger for tweet {job['tweet_id']}: {e}")
+
+def build_async_listener_class():
+    """
+    Builds the AsyncStreamingClient subclass on demand, so the optional aiohttp
+    dependency is only needed when the async mode is actually used.
+    """
+    from tweepy.asynchronous import AsyncStreamingClient
+
+    class AsyncBotStreamListener(AsyncStreamingClient):
+        """Monitors the X stream and schedules one analysis task per trigger tweet."""
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.in_flight = set()
+            self.in_flight_ids = set()
+            self.overflowed = False
+            self.resweep_task = None
+            print("INFO: Async listener active, monitoring X stream...")
+
+        async def on_response(self, response: tweepy.StreamResponse):
+            # --- Same as the threaded listener: on_tweet would fire first, without the includes ---
+            if response.data:
+                await self.handle_tweet(response.data, response.includes)
+
+        async def handle_tweet(self, tweet: tweepy.Tweet, includes: dict = None):
+            job = parse_trigger(tweet, includes)
+            if not job or not await asyncio.to_thread(accept_trigger, job):
+                return
+            print(f"INFO: Trigger detected in tweet {job['tweet_id']}. Scheduling analysis.")
+            self.schedule(job)
+
+        def schedule(self, job: dict) -> bool:
+            """
+            Starts one analysis task; beyond JOB_QUEUE_SIZE the job stays pending in the journal until
+            resweep() picks it up. Returns False when the job was dropped.
+            """
+            key = str(job["tweet_id"])
+            if key in self.in_flight_ids:
+                return True
+            if len(self.in_flight) >= JOB_QUEUE_SIZE:
+                self.overflowed = True
+                print(f"ERROR: {JOB_QUEUE_SIZE} analyses in flight, dropping trigger tweet {job['tweet_id']}.")
+                return False
+            task = asyncio.create_task(process_trigger_async(job))
+            self.in_flight.add(task)
+            self.in_flight_ids.add(key)
+            task.add_done_callback(functools.partial(self.finished, key))
+            return True
+
+        def finished(self, key: str, task: asyncio.Task):
+            self.in_flight.discard(task)
+            self.in_flight_ids.discard(key)
+            # --- Same rule as the threaded JobQueue: re-sweep dropped triggers once half the slots are free ---
+            if self.overflowed and len(self.in_flight) <= JOB_QUEUE_SIZE // 2 and self.resweep_task is None:
+                self.overflowed = False
+                self.resweep_task = asyncio.create_task(self.resweep())
+
+        async def resweep(self):
+            """Async twin of resweep_pending_triggers()."""
+            try:
+                requeued = 0
+                for job in await asyncio.to_thread(get_analysis_store().pending_triggers):
+                    if str(job["tweet_id"]) in self.in_flight_ids:
+                        continue
+                    if len(self.in_flight) >= JOB_QUEUE_SIZE:
+                        self.overflowed = True
+                        break
+                    requeued += self.schedule(job)
+                print(f"INFO: Re-queued {requeued} trigger(s) dropped while {JOB_QUEUE_SIZE} analyses were in flight.")
+            finally:
+                self.resweep_task = None
+
+        async def on_connect(self):
+            await super().on_connect()
+            loop = asyncio.get_running_loop()
+            start_backfill(lambda job: loop.call_soon_threadsafe(self.schedule, job))
+
+        async def on_errors(self, errors):
+            print(f"ERROR: Stream returned errors: {errors}")
+
+    return AsyncBotStreamListener
+
+async def sync_stream_rules_async(listener):
+    """
+    Async twin of sync_stream_rules().
+    """
+    to_add, to_delete = diff_stream_rules((await listener.get_rules()).data or [], desired_stream_rules())
+    if to_add:
+        await listener.add_rules(to_add)
+        print(f"INFO: Stream rules added: {[rule.value for rule in to_add]}")
+    if to_delete:
+        await listener.delete_rules(to_delete)
+        print(f"INFO: {len(to_delete)} stale stream rule(s) removed.")
+    if not to_add and not to_delete:
+        print(f"INFO: Stream rule already set: '{STREAM_RULE}'")
+
+async def run_async_bot():
+    """
+    Runs the whole bot on one event loop: async stream, async X client and async Gemini calls.
+    """
+    global x_async_client, x_semaphore, gemini_semaphore
+    warm_clients([get_gemini_model])
+    from tweepy.asynchronous import AsyncClient
+
+    x_async_client = AsyncClient(
+        bearer_token=X_BEARER_TOKEN, consumer_key=X_API_KEY,
+        consumer_secret=X_API_KEY_SECRET, access_token=X_ACCESS_TOKEN,
+        access_token_secret=X_ACCESS_TOKEN_SECRET, wait_on_rate_limit=False
+    )
+    x_semaphore = asyncio.Semaphore(ASYNC_X_CONCURRENCY)
+    gemini_semaphore = asyncio.Semaphore(ASYNC_GEMINI_CONCURRENCY)
+    print(f"INFO: Async mode: up to {ASYNC_X_CONCURRENCY} X calls and {ASYNC_GEMINI_CONCURRENCY} Gemini calls in flight.")
+    start_metrics_reporter()
+    start_metrics_server()
+
+    listener = build_async_listener_class()(bearer_token=X_BEARER_TOKEN)
+    replay_pending_triggers(listener.schedule)
+    reply_outbox.start()
+    loop = asyncio.get_running_loop()
+    start_mentions_poller(lambda job: loop.call_soon_threadsafe(listener.schedule, job))
+
+    await sync_stream_rules_async(listener)
+    await listener.filter(expansions=STREAM_EXPANSIONS, tweet_fields=STREAM_TWEET_FIELDS)
+
+
+# ==============================================================================
+# 11. MULTI-PROCESS MODE: STREAM INTAKE, ANALYSIS WORKERS & REPLY POSTER
+# ==============================================================================
+# --- Broker = the triggers table: intake writes 'pending', analysis leases -> 'analyzed', poster leases -> 'done' ---
+def run_next_trigger(status: str, worker: str, handle) -> bool:
+    """
+    Leases the oldest trigger in `status` and runs `handle(job)` on it. Returns False when none was ready.
+    RateLimited jobs are deferred in the broker; other errors from `handle` mark the trigger failed.
+    """
+    job = get_analysis_store().claim_trigger(status, worker, BROKER_LEASE_SECONDS)
+    if job is None:
+        return False
+    try:
+        handle(job)
+    except RateLimited as e:
+        print(f"WARNING: {e}; deferring trigger tweet {job['tweet_id']}.")
+        get_analysis_store().defer_trigger(job["tweet_id"], e.retry_after)
+    except Exception as e:
+        stage_metrics.observe("end_to_end", time.monotonic() - job["received_at"], "error")
+        get_analysis_store().finish_trigger(job["tweet_id"], "failed", str(e))
+        print(f"ERROR: Failed to process trigger for tweet {job['tweet_id']}: {e}")
+    return True
+
+def drain_broker(status: str, worker: str, handle):
+    """
+    Runs run_next_trigger() forever. A broker error (e.g. "database is locked" after the busy timeout)
+    is logged and retried with exponential backoff instead of silently ending the worker thread,
+    which the supervisor would never notice.
+    """
+    backoff = BROKER_POLL_SECONDS
+    while True:
+        try:
+            found = run_next_trigger(status, worker, handle)
+            backoff = BROKER_POLL_SECONDS
+        except Exception as e:
+            stage_metrics.increment("broker_errors")
+            print(f"ERROR: {worker} could not use the trigger broker: {e}; retrying in {backoff:.1f}s.")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, BROKER_ERROR_MAX_BACKOFF_SECONDS)
+            continue
+        if not found:
+            time.sleep(BROKER_POLL_SECONDS)
+
+def run_intake():
+    """Stream-intake role: journals triggers into the broker and never analyzes anything itself."""
+    warm_clients([get_x_client])
+    start_metrics_reporter()
+    # --- One process owns the port; the broker backlog gauge covers the whole pipeline from here ---
+    start_metrics_server()
+    start_mentions_poller(submit=lambda job: None)
+    listener = build_listener_class()(bearer_token=X_BEARER_TOKEN, submit=lambda job: None)
+    sync_stream_rules(listener)
+    listener.filter(expansions=STREAM_EXPANSIONS, tweet_fields=STREAM_TWEET_FIELDS)
+
+def run_analysis_worker(name: str):
+    """Analysis role: leases pending triggers and stores their finished reports."""
+    warm_clients()
+    start_metrics_reporter()
+
+    # --- Worker threads inside the process keep the micro-batchers and single-flight useful ---
+    threads = [
+        threading.Thread(target=drain_broker, args=("pending", f"{name}-{i}", process_trigger), daemon=True)
+        for i in range(WORKER_COUNT)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def run_reply_poster(name: str):
+    """Reply-poster role: runs the reply outbox, which leases analyzed triggers and posts them."""
+    warm_clients([get_x_client])
+    start_metrics_reporter()
+    reply_outbox.name = name
+    reply_outbox.run_forever()
+
+def run_role(role: str, index: int = 0):
+    """Entry point of one child process in multi-process mode."""
+    name = f"{role}-{index}@{os.getpid()}"
+    print(f"INFO: Starting {name}.")
+    if role == "intake":
+        run_intake()
+    elif role == "analysis":
+        run_analysis_worker(name)
+    elif role == "poster":
+        run_reply_poster(name)
+    else:
+        raise ValueError(f"Unknown process role: {role}")
+
+def run_sharded(analysis_processes: int):
+    """
+    Supervises one intake process, `analysis_processes` analysis workers and one reply poster,
+    restarting any that exits. Children commit store writes immediately (RUGGUARD_DB_COMMIT_BATCH=1),
+    because SQLite allows a single writer across processes.
+    """
+    import multiprocessing
+
+    os.environ["RUGGUARD_DB_COMMIT_BATCH"] = "1"
+    context = multiprocessing.get_context("spawn")
+    roles = [("intake", 0), ("poster", 0)] + [("analysis", i) for i in range(analysis_processes)]
+    processes = {}
+
+    def start(role: str, index: int):
+        process = context.Process(target=run_role, args=(role, index), name=f"rugguard-{role}-{index}", daemon=True)
+        process.start()
+        processes[(role, index)] = process
+
+    for role, index in roles:
+        start(role, index)
+    print(f"INFO: Multi-process mode: 1 intake, {analysis_processes} analysis and 1 poster process(es).")
+
+    while True:
+        time.sleep(PROCESS_RESTART_DELAY_SECONDS)
+        for (role, index), process in list(processes.items()):
+            if not process.is_alive():
+                print(f"WARNING: {process.name} exited with code {process.exitcode}; restarting it.")
+                start(role, index)
+
+
 # ==============================================================================
-# 3. X API STREAM LISTENER
+# 12. BATCH SCREENING MODE: ANALYZE A LIST OF ACCOUNTS FROM A FILE
 # ==============================================================================
-class BotStreamListener(tweepy.StreamingClient):
-    """Monitors the X stream and triggers the analysis workflow."""
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        print("INFO: Listener active, monitoring X stream...")
+def read_batch_targets(lines) -> list:
+    """
+    Parses one account per line: a numeric user ID, or a handle (a leading @ forces handle lookup
+    for all-digit handles). Blank lines and # comments are skipped, duplicates are dropped.
+    """
+    targets = (line.split("#", 1)[0].strip() for line in lines)
+    return list(dict.fromkeys(target for target in targets if target))
 
-    def on_tweet(self, tweet: tweepy.Tweet):
-        is_reply = tweet.referenced_tweets and tweet.referenced_tweets[0].type == 'replied_to'
-        if is_reply and TRIGGER_PHRASE.lower() in tweet.text.lower():
-            print(f"INFO: Trigger detected in tweet {tweet.id}. Initiating analysis.")
+def load_finished_targets(output_path: str) -> set:
+    """
+    Returns the inputs a previous run already analyzed successfully; failed ones are retried.
+    A last line cut off by an interruption is truncated away, so appends stay line-aligned.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    finished, complete_bytes = set(), 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete_bytes += len(line)
             try:
-                original_tweet_id = tweet.referenced_tweets[0].id
-                target_user_id = x_client.get_tweet(original_tweet_id, expansions=["author_id"]).data.author_id
-
-                if target_user_id:
-                    final_report = get_user_data_and_analyze(target_user_id)
-                    x_client.create_tweet(text=final_report, in_reply_to_tweet_id=tweet.id)
-                    print(f"INFO: Reply sent successfully for tweet {tweet.id}.")
-                else:
-                    raise Exception("Original author ID not found.")
+                record = json.loads(line)
+                if record["status"] == "ok":
+                    finished.add(record["input"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    if complete_bytes < os.path.getsize(output_path):
+        print(f"WARNING: Dropping an incomplete last line from {output_path}.")
+        os.truncate(output_path, complete_bytes)
+    return finished
+
+HANDLE_PATTERN = re.compile(r"^[A-Za-z0-9_]{1,15}$")
+
+def resolve_handles(handles: list):
+    """
+    Looks up handles 100 at a time with get_users(usernames=...), waiting out rate limits.
+    Returns ({handle.lower(): user ID}, {handle.lower(): error}); malformed handles are rejected
+    locally and a chunk the API refuses fails only its own handles, so one bad entry never stops the run.
+    """
+    resolved, errors = {}, {}
+    valid = []
+    for handle in handles:
+        if HANDLE_PATTERN.match(handle):
+            valid.append(handle)
+        else:
+            errors[handle.lower()] = "Not a valid user ID or handle."
+    for start in range(0, len(valid), 100):
+        chunk = valid[start:start + 100]
+        print(f"INFO: Resolving {len(chunk)} handle(s) in one get_users call.")
+        while True:
+            try:
+                with stage_metrics.time("get_users"):
+                    response = get_x_client().get_users(usernames=chunk, user_fields=USER_FIELDS)
+                resolved.update({user.username.lower(): str(user.id) for user in response.data or []})
+                break
+            except RateLimited as e:
+                print(f"WARNING: {e}; handle lookup waits.")
+                time.sleep(e.retry_after)
             except Exception as e:
-                print(f"ERROR: Failed to process trigger for tweet {tweet.id}: {e}")
+                print(f"ERROR: Could not resolve {len(chunk)} handle(s): {e}")
+                errors.update({handle.lower(): f"Handle lookup failed: {e}" for handle in chunk})
+                break
+    return resolved, errors
 
-    def on_error(self, status):
-        print(f"ERROR: Stream error with status code: {status}")
+def screen_account(target: str, user_id, lookup_error: str = None) -> dict:
+    """
+    Runs one batch target through get_user_data_and_analyze(), waiting out rate limits, and
+    returns its JSONL record.
+    """
+    record = {"input": target, "user_id": user_id}
+    if user_id is None:
+        return {**record, "status": "failed", "error": lookup_error or "User not found."}
+    while True:
+        try:
+            report = get_user_data_and_analyze(user_id)
+            break
+        except RateLimited as e:
+            print(f"WARNING: {e}; batch target {target} waits.")
+            time.sleep(e.retry_after)
+    if report.startswith("Analysis Failed"):
+        return {**record, "status": "failed", "error": report.split(":", 1)[1].strip()}
+    # --- A Gemini error still comes back wrapped in the reply template ---
+    if LLM_ERROR_MESSAGE in report:
+        return {**record, "status": "failed", "error": LLM_ERROR_MESSAGE}
+    if (trust_signal := parse_trust_signal(report)) is None:
+        return {**record, "status": "failed", "error": "No Trust Signal in the report."}
+    return {**record, "status": "ok", "trust_signal": trust_signal, "report": report}
 
+def run_batch(input_path: str, output_path: str, concurrency: int) -> int:
+    """
+    Analyzes every account listed in input_path ("-" for stdin) with at most `concurrency` analyses
+    in flight, appending one JSON line per account to output_path as each finishes. Accounts already
+    analyzed in output_path are skipped, so an interrupted run resumes where it stopped and a rerun
+    retries only the failures. Returns the failure count.
+    """
+    with (sys.stdin if input_path == "-" else open(input_path, encoding="utf-8")) as f:
+        targets = read_batch_targets(f)
+    finished = load_finished_targets(output_path)
+    pending = [target for target in targets if target not in finished]
+    print(f"INFO: Batch of {len(targets)} account(s): {len(targets) - len(pending)} already done, {len(pending)} to analyze.")
+    if not pending:
+        return 0
+
+    warm_clients()
+    handles = [target.lstrip("@") for target in pending if not target.isdigit()]
+    resolved, lookup_errors = resolve_handles(handles) if handles else ({}, {})
+    failures = 0
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        for target in pending:
+            handle = target.lstrip("@").lower()
+            user_id = target if target.isdigit() else resolved.get(handle)
+            futures[pool.submit(screen_account, target, user_id, lookup_errors.get(handle))] = target
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"input": futures[future], "status": "failed", "error": str(e)}
+            failures += record["status"] != "ok"
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            print(f"INFO: Batch progress {done}/{len(pending)}: {record['input']} -> {record.get('trust_signal') or record['status']}")
+    get_analysis_store().flush()
+    return failures
 
 # ==============================================================================
-# 4. MAIN EXECUTION BLOCK
+# 13. MAIN EXECUTION BLOCK
 # ==============================================================================
+def parse_args(argv=None):
+    """Parses the command line for the bot entry point."""
+    parser = argparse.ArgumentParser(description="Project RUGGUARD LLM-powered analysis bot.")
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Run the asyncio pipeline (AsyncStreamingClient, AsyncClient, async Gemini calls)."
+    )
+    parser.add_argument(
+        "--processes", type=int, default=0, metavar="N",
+        help="Run one stream-intake process, N analysis worker processes and one reply poster."
+    )
+    subcommands = parser.add_subparsers(dest="command")
+    batch = subcommands.add_parser("batch", help="Analyze a list of accounts and write JSONL results, then exit.")
+    batch.add_argument("input", help="File with one user ID or @handle per line, or - for stdin.")
+    batch.add_argument("-o", "--output", required=True,
+                       help="JSONL results file; accounts already in it are skipped, so reruns resume.")
+    batch.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                       help=f"Maximum analyses in flight (default {BATCH_CONCURRENCY}).")
+    return parser.parse_args(argv)
+
+def run_bot():
+    """Runs the threaded bot: the stream listener feeding the worker pool."""
+    warm_clients()
+    start_workers()
+    replay_pending_triggers(enqueue_trigger)
+    start_mentions_poller()
+    start_metrics_reporter()
+    start_metrics_server()
+    listener = build_listener_class()(bearer_token=X_BEARER_TOKEN)
+
+    sync_stream_rules(listener)
+    listener.filter(expansions=STREAM_EXPANSIONS, tweet_fields=STREAM_TWEET_FIELDS)
+
+# --- Everything above must stay cheap to import; SDKs load lazily on first use. ---
+check_import_budget()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "batch":
+        sys.exit(1 if run_batch(args.input, args.output, max(1, args.concurrency)) else 0)
     print("INFO: Initializing LLM-Powered RUGGUARD Bot...")
-    listener = BotStreamListener(bearer_token=X_BEARER_TOKEN)
-    
-    # Reset stream rules to ensure a clean state
-    if rules := listener.get_rules().data:
-        listener.delete_rules([rule.id for rule in rules])
-        print("INFO: Old stream rules cleared.")
-        
-    rule = f"@{BOT_USERNAME} {TRIGGER_PHRASE}"
-    listener.add_rules(tweepy.StreamRule(rule))
-    print(f"INFO: Stream rule set: '{rule}'")
-    
-    listener.filter(expansions=["author_id"], tweet_fields=["referenced_tweets"])
\ No newline at end of file
+    if args.processes > 0:
+        run_sharded(args.processes)
+    elif args.use_async:
+        asyncio.run(run_async_bot())
+    else:
+        run_bot()